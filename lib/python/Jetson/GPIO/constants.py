@@ -24,6 +24,13 @@ RISING = 1 + _EDGE_OFFSET
 FALLING = 2 + _EDGE_OFFSET
 BOTH = 3 + _EDGE_OFFSET
 
+# What to do with an event callback once the backlog of callbacks waiting for
+# an executor is full
+_OVERFLOW_OFFSET = 50
+DROP_OLDEST = 1 + _OVERFLOW_OFFSET
+DROP_NEWEST = 2 + _OVERFLOW_OFFSET
+BLOCK = 3 + _OVERFLOW_OFFSET
+
 # GPIO directions. UNKNOWN constant is for gpios that are not yet setup
 UNKNOWN = -1
 OUT = 0
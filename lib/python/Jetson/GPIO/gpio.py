@@ -23,6 +23,8 @@ from Jetson.GPIO.constants import *
 from Jetson.GPIO import gpio_event as event
 from Jetson.GPIO import gpio_pin_data
 from Jetson.GPIO import gpio_cdev
+import asyncio
+import collections
 import os
 import warnings
 import time
@@ -50,6 +52,31 @@ _channel_configuration = {}
 # Dictionary used as a lookup table from GPIO chip name to chip fd
 _chip_fd = {}
 
+# Dictionary used to count the channels set up on each GPIO chip. The chip fd
+# is shared by all of them and only closed when the last one is cleaned up
+# key: GPIO chip name, value: number of channels holding the chip fd
+_chip_users = {}
+
+# Dictionary used as a lookup table from channel to the PinHandle object handed
+# out by get_handle(), which cleanup() invalidates
+# key: channel, value: PinHandle object
+_pin_handles = {}
+
+# Lookup table from cdev event id to the edge it reports
+_EVENT_EDGES = {
+    gpio_cdev.GPIOEVENT_EVENT_RISING_EDGE: RISING,
+    gpio_cdev.GPIOEVENT_EVENT_FALLING_EDGE: FALLING,
+}
+
+# An edge detected on a channel, passed to the callbacks added with
+# pass_event=True
+# @channel the channel the edge was detected on
+# @edge RISING or FALLING
+# @timestamp_ns the time the kernel detected the edge at (ns)
+# @seqno the sequence number of the edge on the channel, counting the edges the
+# kernel reported since edge detection was added
+EdgeEvent = collections.namedtuple('EdgeEvent', ['channel', 'edge', 'timestamp_ns', 'seqno'])
+
 
 def _validate_mode_set():
     if _gpio_mode is None:
@@ -115,22 +142,179 @@ def _chip_fd_map(ch_info):
     return _chip_fd.get(ch_info.gpio_chip, None)
 
 
-def _do_one_channel(ch_info, direction, initial, consumer):
-    ch_info.chip_fd = _chip_fd_map(ch_info)
+# Take a reference on the chip fd of a channel, opening the chip if no other
+# channel holds it yet
+def _chip_acquire(ch_info):
+    chip_fd = _chip_fd_map(ch_info)
+
+    if chip_fd is None:
+        chip_fd = gpio_cdev.chip_open_by_label(ch_info.gpio_chip)
+        _chip_fd[ch_info.gpio_chip] = chip_fd
+
+    _chip_users[ch_info.gpio_chip] = _chip_users.get(ch_info.gpio_chip, 0) + 1
+    ch_info.chip_fd = chip_fd
+
+
+# Drop the reference a channel holds on its chip fd, closing the chip once no
+# channel holds it anymore
+def _chip_release(ch_info):
+    if ch_info.chip_fd is None:
+        return
+    ch_info.chip_fd = None
+
+    users = _chip_users.get(ch_info.gpio_chip, 0) - 1
+    if users > 0:
+        _chip_users[ch_info.gpio_chip] = users
+        return
+
+    _chip_users.pop(ch_info.gpio_chip, None)
+    gpio_cdev.close_chip(_chip_fd.pop(ch_info.gpio_chip, None))
 
-    if not ch_info.chip_fd:
-        ch_info.chip_fd = gpio_cdev.chip_open_by_label(ch_info.gpio_chip)
-        _chip_fd[ch_info.gpio_chip] = ch_info.chip_fd
+
+# Request the lines of channels that all belong to the same chip through one
+# line handle. The channels must hold a reference on the chip fd.
+def _request_lines(ch_infos, cdev_direction, initials, consumer):
+    request = gpio_cdev.request_handle([ch_info.line_offset for ch_info in ch_infos],
+                                       cdev_direction, initials, consumer)
+    line_group = gpio_cdev.open_lines(ch_infos[0].chip_fd, request)
+    line_group.channels = ch_infos
+
+    for index, ch_info in enumerate(ch_infos):
+        ch_info.line_group = line_group
+        ch_info.line_index = index
+
+
+def _do_one_chip(ch_infos, direction, initials, consumer):
+    for ch_info in ch_infos:
+        _chip_acquire(ch_info)
 
     cdev_direction = gpio_cdev.GPIOHANDLE_REQUEST_OUTPUT if direction == OUT else gpio_cdev.GPIOHANDLE_REQUEST_INPUT
-    request = gpio_cdev.request_handle(ch_info.line_offset, cdev_direction, initial, consumer)
+    try:
+        _request_lines(ch_infos, cdev_direction, initials, consumer)
+    except:
+        for ch_info in ch_infos:
+            _chip_release(ch_info)
+        raise
+
+    for ch_info in ch_infos:
+        ch_info.consumer = consumer
+
+        if _gpio_warnings:
+            gpio_cdev.check_pinmux(ch_info, direction)
+
+        _channel_configuration[ch_info.channel] = direction
+
+
+# Release the line of a channel from its line handle. A line handle can only
+# be released as a whole, so the lines it still holds for other channels are
+# requested again through a new handle, keeping their direction and values.
+# Those lines are therefore released for a moment. If they can not be requested
+# again, e.g. another consumer took one of them meanwhile, their channels are
+# no longer set up.
+def _release_line(ch_info):
+    line_group = ch_info.line_group
+    if line_group is None:
+        return
+
+    gpio_cdev.close_line(line_group.fd)
+    line_group.fd = None
+    ch_info.line_group = None
+    ch_info.line_index = None
+
+    ch_infos = [c for c in line_group.channels if c is not ch_info]
+    if not ch_infos:
+        return
+
+    if line_group.direction == gpio_cdev.GPIOHANDLE_REQUEST_OUTPUT:
+        initials = [line_group.values.values[c.line_index] for c in ch_infos]
+    else:
+        initials = [None] * len(ch_infos)
+    try:
+        _request_lines(ch_infos, line_group.direction, initials, line_group.consumer)
+    except:
+        for other in ch_infos:
+            other.line_group = None
+            other.line_index = None
+            _channel_configuration.pop(other.channel, None)
+            pin_handle = _pin_handles.pop(other.channel, None)
+            if pin_handle is not None:
+                pin_handle._invalidate()
+            _chip_release(other)
+        raise
+
+
+# Validate the debounce time given either as bouncetime (ms) or bouncetime_us
+# (us), returning it in microseconds or None if it is not provided
+def _bouncetime_us(bouncetime, bouncetime_us):
+    # if bouncetime is provided, it must be int and greater than 0
+    if bouncetime is not None:
+        if type(bouncetime) != int:
+            raise TypeError("bouncetime must be an integer")
+
+        elif bouncetime < 0:
+            raise ValueError("bouncetime must be an integer greater than 0")
+
+    # if bouncetime_us is provided, it must be int and greater than 0
+    if bouncetime_us is not None:
+        if type(bouncetime_us) != int:
+            raise TypeError("bouncetime_us must be an integer")
+
+        elif bouncetime_us < 0:
+            raise ValueError("bouncetime_us must be an integer greater than 0")
+
+        if bouncetime is not None:
+            raise ValueError("Only one of bouncetime and bouncetime_us can be provided")
+
+        return bouncetime_us
 
-    gpio_cdev.open_line(ch_info, request)
+    return bouncetime * 1000 if bouncetime is not None else None
 
-    if _gpio_warnings:
-        gpio_cdev.check_pinmux(ch_info, direction)
 
-    _channel_configuration[ch_info.channel] = direction
+# Have the line of an input channel report the events of an edge, through a
+# line handle that still reads its value. With the v2 uAPI a line handle that
+# only holds this line is reconfigured in place. Otherwise the line is split
+# off its line handle and requested again with edge detection. The kernel
+# debounces the edges for bouncetime_us (us) where it supports it.
+def _request_edge_line(ch_info, edge, bouncetime_us):
+    debounce_us = bouncetime_us or 0
+
+    line_group = ch_info.line_group
+    if (gpio_cdev.uapi_v2() and line_group is not None and
+            len(line_group.channels) == 1):
+        gpio_cdev.set_edge(line_group, edge, debounce_us)
+        return line_group
+
+    _release_line(ch_info)
+
+    request = gpio_cdev.request_event(ch_info.line_offset, edge, ch_info.consumer,
+                                      debounce_us)
+    line_group = gpio_cdev.open_event_line(ch_info.chip_fd, request, edge, debounce_us)
+    line_group.channels = [ch_info]
+    ch_info.line_group = line_group
+    ch_info.line_index = 0
+
+    return line_group
+
+
+# Stop the line of an input channel from detecting edges once its edge
+# detection is removed
+def _restore_line(ch_info):
+    if _app_channel_configuration(ch_info) != IN:
+        return
+    if event.gpio_event_added(ch_info.gpio_chip, ch_info.channel):
+        return
+
+    line_group = ch_info.line_group
+    if line_group is not None:
+        if line_group.edge is None:
+            return
+        if gpio_cdev.uapi_v2():
+            gpio_cdev.set_edge(line_group, None)
+            return
+        _release_line(ch_info)
+
+    _request_lines([ch_info], gpio_cdev.GPIOHANDLE_REQUEST_INPUT, [None],
+                   ch_info.consumer)
 
 
 def _pwm_path(ch_info):
@@ -221,27 +405,49 @@ def _cleanup_one(ch_info):
         event.event_cleanup(ch_info.gpio_chip, ch_info.channel)
     del _channel_configuration[ch_info.channel]
 
-    # clean gpio config
-    # clean up chip
-    if ch_info.chip_fd:
-        gpio_cdev.close_chip(ch_info.chip_fd)
-        ch_info.chip_fd = None
-        if ch_info.gpio_chip in _chip_fd:
-            del _chip_fd[ch_info.gpio_chip]
+    pin_handle = _pin_handles.pop(ch_info.channel, None)
+    if pin_handle is not None:
+        pin_handle._invalidate()
 
+    # clean gpio config
     # clean up line
-    if ch_info.line_handle:
-        gpio_cdev.close_line(ch_info.line_handle)
-        ch_info.line_handle = None
+    try:
+        _release_line(ch_info)
+    finally:
+        # clean up chip
+        _chip_release(ch_info)
 
 
 def _cleanup_all():
     global _gpio_mode
 
-    for channel in list(_channel_configuration.keys()):
-        ch_info = _channel_to_info(channel)
+    # remove all the event detections first, so the event thread only has to be
+    # woken up and waited for once
+    event.event_cleanup_all()
 
-        _cleanup_one(ch_info)
+    # Every line handle is released, so each one is closed once instead of
+    # splitting the shared handles channel by channel
+    ch_infos = [_channel_to_info(channel) for channel in list(_channel_configuration.keys())]
+    for ch_info in ch_infos:
+        #clean up pwm config
+        if _channel_configuration.pop(ch_info.channel) == HARD_PWM:
+            _disable_pwm(ch_info)
+            _unexport_pwm(ch_info)
+
+        pin_handle = _pin_handles.pop(ch_info.channel, None)
+        if pin_handle is not None:
+            pin_handle._invalidate()
+
+        line_group = ch_info.line_group
+        ch_info.line_group = None
+        ch_info.line_index = None
+        if line_group is not None and line_group.fd is not None:
+            gpio_cdev.close_line(line_group.fd)
+            line_group.fd = None
+
+    # clean up chips
+    for ch_info in ch_infos:
+        _chip_release(ch_info)
 
     _gpio_mode = None
 
@@ -327,11 +533,20 @@ def setup(channels, direction, pull_up_down=_Default(PUD_OFF), initial=None, con
         initial = _make_iterable(initial, len(ch_infos))
         if len(initial) != len(ch_infos):
             raise RuntimeError("Number of values != number of channels")
-        for ch_info, init in zip(ch_infos, initial):
-            _do_one_channel(ch_info, direction, init, consumer)
     else:
-        for ch_info in ch_infos:
-            _do_one_channel(ch_info, direction, initial, consumer)
+        initial = [initial] * len(ch_infos)
+
+    # Channels of the same chip share line handles, each of which holds up to
+    # GPIOHANDLES_MAX lines
+    chip_lines = {}
+    for ch_info, init in zip(ch_infos, initial):
+        chip_lines.setdefault(ch_info.gpio_chip, []).append((ch_info, init))
+
+    for lines in chip_lines.values():
+        for i in range(0, len(lines), gpio_cdev.GPIOHANDLES_MAX):
+            chunk = lines[i:i + gpio_cdev.GPIOHANDLES_MAX]
+            _do_one_chip([ch_info for ch_info, _ in chunk], direction,
+                         [init for _, init in chunk], consumer)
 
 
 # Function used to cleanup channels at the end of the program.
@@ -358,9 +573,34 @@ def cleanup(channel=None):
             _cleanup_one(ch_info)
 
 
+def _input_many(channels):
+    ch_infos = _channels_to_infos(channels, need_gpio=True)
+
+    if any(_app_channel_configuration(ch_info) not in [IN, OUT] for ch_info in ch_infos):
+        raise RuntimeError("You must setup() the GPIO channel first")
+
+    # Each line handle is read once, which samples all of its lines at the
+    # same time
+    group_values = {}
+    values = []
+    for ch_info in ch_infos:
+        line_group = ch_info.line_group
+        data = group_values.get(line_group, None)
+        if data is None:
+            data = group_values[line_group] = gpio_cdev.get_values(line_group)
+        values.append(data[ch_info.line_index])
+
+    return values
+
+
 # Function used to return the current value of the specified channel.
-# Function returns either HIGH or LOW
+# Function returns either HIGH or LOW. Param channel can also be a list/tuple
+# of channels, in which case a list of their values is returned in the same
+# order
 def input(channel):
+    if isinstance(channel, (list, tuple)):
+        return _input_many(channel)
+
     ch_info = _channel_to_info(channel, need_gpio=True)
 
     cur_cfg = _app_channel_configuration(ch_info)
@@ -368,7 +608,7 @@ def input(channel):
         raise RuntimeError("You must setup() the GPIO channel first")
 
     # _GPIOHANDLE_GET_LINE_VALUES_IOCTL, _CGpiohandleData
-    return gpio_cdev.get_value(ch_info.line_handle)
+    return gpio_cdev.get_value(ch_info.line_group, ch_info.line_index)
 
 
 # Function used to set a value to a channel or list/tuple of channels.
@@ -386,18 +626,69 @@ def output(channels, values):
         raise RuntimeError("The GPIO channel has not been set up as an "
                            "OUTPUT")
 
+    if len(ch_infos) == 1:
+        gpio_cdev.set_value(ch_infos[0].line_group, ch_infos[0].line_index, values[0])
+        return
+
+    # Channels that share a line handle are written with a single request, so
+    # their lines change at the same time
+    line_groups = {}
     for ch_info, value in zip(ch_infos, values):
-        gpio_cdev.set_value(ch_info.line_handle, value)
+        line_groups.setdefault(ch_info.line_group, []).append((ch_info.line_index, value))
+
+    for line_group, index_values in line_groups.items():
+        gpio_cdev.set_values(line_group, index_values)
+
+
+# Function used to get a PinHandle object for a channel that has been set up
+# as an input or output. The handle reads and writes the channel without
+# validating it on every call, and it is invalidated when the channel is
+# cleaned up. Param channel must be an integer.
+def get_handle(channel):
+    ch_info = _channel_to_info(channel, need_gpio=True)
+
+    cur_cfg = _app_channel_configuration(ch_info)
+    if cur_cfg not in [IN, OUT]:
+        raise RuntimeError("You must setup() the GPIO channel first")
+
+    pin_handle = _pin_handles.get(channel, None)
+    if pin_handle is None:
+        pin_handle = _pin_handles[channel] = PinHandle(ch_info, cur_cfg)
+
+    return pin_handle
+
+
+# Wrap a user callback into an edge callback of the event module, which is
+# called with the event id, timestamp and sequence number of each edge
+def _edge_callback(channel, callback, pass_event):
+    if not pass_event:
+        return lambda edge_event: callback(channel)
+
+    def _callback(edge_event):
+        event_id, timestamp_ns, seqno = edge_event
+        callback(EdgeEvent(channel, _EVENT_EDGES[event_id], timestamp_ns, seqno))
+    return _callback
 
 
 # Function used to add threaded event detection for a specified gpio channel.
 # Param gpio must be an integer specifying the channel, edge must be RISING,
 # FALLING or BOTH. A callback function to be called when the event is detected
-# and an integer bounctime in milliseconds can be optionally provided. A optional
-# polltime in second can be provided to indicate the max time waiting for an edge.
+# and an integer bounctime in milliseconds can be optionally provided, or
+# bouncetime_us in microseconds for a finer debounce. Param polltime is unused,
+# the event thread waits for the edges without a timeout.
 # Note that one channel only allows one event, which the duplicated event will
-# be ignored.
-def add_event_detect(channel, edge, callback=None, bouncetime=None, polltime=0.2):
+# be ignored. If pass_event is True, the callback is called with an EdgeEvent
+# instead of the channel. If queue_size is provided, up to queue_size events
+# are kept for get_events(), the oldest ones being dropped once it is full.
+# If a concurrent.futures executor is provided, the callbacks run in it instead
+# of the event thread. They run one event at a time and in order if ordered is
+# True, otherwise the callbacks of each event run in their own task. The events
+# waiting for the executor are limited to backlog if it is provided, and once
+# it is full, overflow tells whether to DROP_OLDEST or DROP_NEWEST event, or to
+# BLOCK the event thread until one is taken.
+def add_event_detect(channel, edge, callback=None, bouncetime=None, polltime=0.2, pass_event=False,
+                     queue_size=None, executor=None, ordered=True, backlog=None,
+                     overflow=DROP_OLDEST, bouncetime_us=None):
     ch_info = _channel_to_info(channel, need_gpio=True)
     if (not callable(callback)) and callback is not None:
         raise TypeError("Callback Parameter must be callable")
@@ -413,31 +704,55 @@ def add_event_detect(channel, edge, callback=None, bouncetime=None, polltime=0.2
     else:
         edge = gpio_cdev.GPIOEVENT_REQUEST_RISING_EDGE if edge == RISING else gpio_cdev.GPIOEVENT_REQUEST_FALLING_EDGE if edge == FALLING else gpio_cdev.GPIOEVENT_REQUEST_BOTH_EDGES
 
-    # if bouncetime is provided, it must be int and greater than 0
-    if bouncetime is not None:
-        if type(bouncetime) != int:
-            raise TypeError("bouncetime must be an integer")
+    bouncetime_us = _bouncetime_us(bouncetime, bouncetime_us)
 
-        elif bouncetime < 0:
-            raise ValueError("bouncetime must be an integer greater than 0")
+    # if queue_size is provided, it must be int and greater than 0
+    if queue_size is not None:
+        if type(queue_size) != int:
+            raise TypeError("queue_size must be an integer")
 
-    if ch_info.line_handle:
-        gpio_cdev.close_line(ch_info.line_handle)
+        elif queue_size <= 0:
+            raise ValueError("queue_size must be an integer greater than 0")
 
-    request = gpio_cdev.request_event(ch_info.line_offset, edge, ch_info.consumer)
-    event.add_edge_detect(ch_info.chip_fd, ch_info.gpio_chip, channel, request, bouncetime, polltime)
+    if executor is not None and not callable(getattr(executor, 'submit', None)):
+        raise TypeError("executor must be a concurrent.futures.Executor")
 
-    if callback is not None:
-        event.add_edge_callback(ch_info.gpio_chip, channel, lambda: callback(channel))
+    # if backlog is provided, it must be int and greater than 0
+    if backlog is not None:
+        if type(backlog) != int:
+            raise TypeError("backlog must be an integer")
+
+        elif backlog <= 0:
+            raise ValueError("backlog must be an integer greater than 0")
+
+    if overflow not in [DROP_OLDEST, DROP_NEWEST, BLOCK]:
+        raise ValueError("The overflow must be set to DROP_OLDEST, DROP_NEWEST or BLOCK")
 
-    # We should wait until the thread is up, which the device buffer cleaning takes time
-    time.sleep(1)
+    if event.gpio_event_added(ch_info.gpio_chip, channel):
+        warnings.warn("Warning: event is already added, ignore new added event", RuntimeWarning)
+        return
+
+    try:
+        line_group = _request_edge_line(ch_info, edge, bouncetime_us)
+        # Bounces debounced by the kernel never reach the event thread
+        if gpio_cdev.kernel_debounce():
+            bouncetime_us = None
+        event.add_edge_detect(line_group.fd, ch_info.gpio_chip, channel, bouncetime_us, queue_size,
+                              executor, ordered, backlog, overflow)
+    finally:
+        _restore_line(ch_info)
+
+    if callback is not None:
+        event.add_edge_callback(ch_info.gpio_chip, channel,
+                                _edge_callback(channel, callback, pass_event))
 
 # Function used to remove event detection for channel
-# Timeout param for the max time to wait for thread (event detecion) to end
+# Event detection is removed at once, timeout param is the max time to wait
+# for the event thread to exit once no event detection is left
 def remove_event_detect(channel, timeout=0.5):
     ch_info = _channel_to_info(channel, need_gpio=True)
     event.remove_edge_detect(ch_info.gpio_chip, channel, timeout)
+    _restore_line(ch_info)
 
 
 # Function used to check if an event occurred on the specified channel.
@@ -454,9 +769,56 @@ def event_detected(channel):
     return event.edge_event_detected(ch_info.gpio_chip, channel)
 
 
+# Function used to take the events queued for a channel whose event detection
+# was added with a queue_size, oldest first. At most max_n events are taken if
+# it is provided. The function returns a list of EdgeEvent objects.
+def get_events(channel, max_n=None):
+    ch_info = _channel_to_info(channel, need_gpio=True)
+
+    if max_n is not None and (type(max_n) != int or max_n < 0):
+        raise ValueError("max_n must be an integer greater than or equal to 0")
+
+    edge_events = event.get_edge_events(ch_info.gpio_chip, channel, max_n)
+    if edge_events is None:
+        raise RuntimeError("Add event detection with a queue_size using "
+                           "add_event_detect first")
+
+    return [EdgeEvent(channel, _EVENT_EDGES[event_id], timestamp_ns, seqno)
+            for event_id, timestamp_ns, seqno in edge_events]
+
+
+# Function used to get the number of events dropped from the queue of a channel
+# because it was full, since its event detection was added
+def events_dropped(channel):
+    ch_info = _channel_to_info(channel, need_gpio=True)
+
+    dropped = event.edge_events_dropped(ch_info.gpio_chip, channel)
+    if dropped is None:
+        raise RuntimeError("Add event detection with a queue_size using "
+                           "add_event_detect first")
+
+    return dropped
+
+
+# Function used to get the number of events whose callbacks were dropped
+# because the backlog of the executor was full or the executor did not take them,
+# e.g. once it was shut down, since the event detection of the channel was added
+# with an executor
+def callbacks_dropped(channel):
+    ch_info = _channel_to_info(channel, need_gpio=True)
+
+    dropped = event.edge_callbacks_dropped(ch_info.gpio_chip, channel)
+    if dropped is None:
+        raise RuntimeError("Add event detection with an executor using "
+                           "add_event_detect first")
+
+    return dropped
+
+
 # Function used to add a callback function to channel, after it has been
-# registered for events using add_event_detect()
-def add_event_callback(channel, callback):
+# registered for events using add_event_detect(). If pass_event is True, the
+# callback is called with an EdgeEvent instead of the channel.
+def add_event_callback(channel, callback, pass_event=False):
     ch_info = _channel_to_info(channel, need_gpio=True)
     if not callable(callback):
         raise TypeError("Parameter must be callable")
@@ -469,13 +831,43 @@ def add_event_callback(channel, callback):
         raise RuntimeError("Add event detection using add_event_detect first "
                            "before adding a callback")
 
-    event.add_edge_callback(ch_info.gpio_chip, channel, lambda: callback(channel))
+    event.add_edge_callback(ch_info.gpio_chip, channel,
+                            _edge_callback(channel, callback, pass_event))
 
-    # We should wait until the thread is up, which the device buffer cleaning takes time
-    time.sleep(1)
+# Validate the time limit given either as timeout (s), timeout_ms (ms) or
+# timeout_ns (ns), returning it in seconds or None if it is not provided
+def _timeout_s(timeout, timeout_ms, timeout_ns):
+    timeouts = [(name, value, scale) for name, value, scale in
+                (("Timeout", timeout, 1), ("timeout_ms", timeout_ms, 1E-3),
+                 ("timeout_ns", timeout_ns, 1E-9)) if value is not None]
+    if not timeouts:
+        return None
+    if len(timeouts) > 1:
+        raise ValueError("Only one of timeout, timeout_ms and timeout_ns can be provided")
 
-# Function used to wait for a edge event in blocking mode, it is also one-shoot.
-def wait_for_edge(channel, edge, bouncetime=None, timeout=None):
+    # if timeout is specified, it must be a number and greater than 0
+    name, value, scale = timeouts[0]
+    if type(value) not in [int, float]:
+        raise TypeError(name + " must be an integer or a float")
+
+    elif value < 0:
+        raise ValueError(name + " must greater than 0")
+
+    return value * scale
+
+
+# Validate the parameters of wait_for_edge() and async_wait_for_edge(),
+# returning the ChannelInfo object of the channel, the cdev edge, the
+# debounce time (us) and the time limit (s)
+def _wait_for_edge_args(channel, edge, bouncetime, bouncetime_us, timeout, timeout_ms=None,
+                        timeout_ns=None):
+    ch_info = _wait_for_edge_channel(channel)
+    return (ch_info,) + _wait_for_edge_params(edge, bouncetime, bouncetime_us, timeout,
+                                              timeout_ms, timeout_ns)
+
+
+# Validate a channel to wait for the edges of, returning its ChannelInfo object
+def _wait_for_edge_channel(channel):
     ch_info = _channel_to_info(channel, need_gpio=True)
 
     # channel must be setup as input
@@ -483,6 +875,25 @@ def wait_for_edge(channel, edge, bouncetime=None, timeout=None):
         raise RuntimeError("You must setup() the GPIO channel as an input "
                            "first")
 
+    return ch_info
+
+
+# Validate the channels to wait for the edges of at once, returning their
+# ChannelInfo objects
+def _wait_for_edge_channels(channels):
+    channels = list(_make_iterable(channels))
+    if not channels:
+        raise ValueError("At least one channel must be provided")
+    if len(set(channels)) != len(channels):
+        raise ValueError("A channel can only be provided once")
+
+    return [_wait_for_edge_channel(channel) for channel in channels]
+
+
+# Validate the edge, debounce time and time limit of an edge wait, returning
+# the cdev edge, the debounce time (us) and the time limit (s)
+def _wait_for_edge_params(edge, bouncetime, bouncetime_us, timeout, timeout_ms=None,
+                          timeout_ns=None):
     # edge provided must be rising, falling or both
     if edge != RISING and edge != FALLING and edge != BOTH:
         raise ValueError("The edge must be set to RISING, FALLING_EDGE "
@@ -490,27 +901,43 @@ def wait_for_edge(channel, edge, bouncetime=None, timeout=None):
     else:
         edge = gpio_cdev.GPIOEVENT_REQUEST_RISING_EDGE if edge == RISING else gpio_cdev.GPIOEVENT_REQUEST_FALLING_EDGE if edge == FALLING else gpio_cdev.GPIOEVENT_REQUEST_BOTH_EDGES
 
-    # if bouncetime is provided, it must be int and greater than 0
-    if bouncetime is not None:
-        if type(bouncetime) != int:
-            raise TypeError("bouncetime must be an integer")
+    bouncetime_us = _bouncetime_us(bouncetime, bouncetime_us)
 
-        elif bouncetime < 0:
-            raise ValueError("bouncetime must be an integer greater than 0")
+    return edge, bouncetime_us, _timeout_s(timeout, timeout_ms, timeout_ns)
 
-    # if timeout is specified, it must be an int and greater than 0
-    if timeout is not None:
-        if type(timeout) != int:
-            raise TypeError("Timeout must be an integer")
 
-        elif timeout < 0:
-            raise ValueError("Timeout must greater than 0")
+# Function used to wait for a edge event in blocking mode, it is also one-shoot.
+# If persistent is True, the edge detection is kept once it returns, so the
+# edges happening until the next wait_for_edge() call of the channel are not
+# lost, and that call returns at once for each of them. It is kept until a
+# wait_for_edge() call without persistent, for another edge or bouncetime, or
+# remove_event_detect() or cleanup() of the channel. The timeout is given in
+# seconds, as an integer or a float, or in timeout_ms or timeout_ns instead.
+def wait_for_edge(channel, edge, bouncetime=None, timeout=None, bouncetime_us=None,
+                  persistent=False, timeout_ms=None, timeout_ns=None):
+    ch_info, edge, bouncetime_us, timeout = _wait_for_edge_args(
+        channel, edge, bouncetime, bouncetime_us, timeout, timeout_ms, timeout_ns)
+
+    # a persistent wait armed for another edge or bouncetime is removed
+    armed = event.edge_wait_armed(ch_info.gpio_chip, channel)
+    if armed and not (ch_info.line_group.edge == edge and
+                      ch_info.line_group.debounce_us == (bouncetime_us or 0)):
+        _disarm_edge_wait(ch_info)
+        armed = False
+
+    if not armed and event.gpio_event_added(ch_info.gpio_chip, channel):
+        raise RuntimeError("Conflicting edge detection event already exists "
+                           "for this GPIO channel")
 
-    if ch_info.line_handle:
-        gpio_cdev.close_line(ch_info.line_handle)
+    # Bounces debounced by the kernel never reach the waiter
+    debounce_us = None if gpio_cdev.kernel_debounce() else bouncetime_us
 
-    request = gpio_cdev.request_event(ch_info.line_offset, edge, ch_info.consumer)
-    result = event.blocking_wait_for_edge(ch_info.chip_fd, ch_info.gpio_chip, channel, request, bouncetime, timeout)
+    try:
+        line_group = ch_info.line_group if armed else _request_edge_line(ch_info, edge, bouncetime_us)
+        result = event.blocking_wait_for_edge(line_group.fd, ch_info.gpio_chip, channel, debounce_us,
+                                              timeout, persistent)
+    finally:
+        _restore_line(ch_info)
 
     # If not error, result == channel. If timeout occurs while waiting,
     # result == None. If error occurs, result == -1 means channel is
@@ -528,6 +955,189 @@ def wait_for_edge(channel, edge, bouncetime=None, timeout=None):
     return channel
 
 
+# Function used to wait for edge events on one or more channels in blocking
+# mode, it is also one-shoot. Param channels can be an integer or a non-empty
+# list/tuple of distinct integers, the other parameters are the same as
+# wait_for_edge(). The edge
+# handles of all the channels are waited on at once, without a thread per
+# channel. The function returns a list of EdgeEvent objects of the edges
+# detected, oldest first, or None if a timeout occurred.
+def wait_for_any_edge(channels, edge, bouncetime=None, timeout=None, bouncetime_us=None,
+                      timeout_ms=None, timeout_ns=None):
+    ch_infos = _wait_for_edge_channels(channels)
+    cdev_edge, debounce_us, timeout_s = _wait_for_edge_params(
+        edge, bouncetime, bouncetime_us, timeout, timeout_ms, timeout_ns)
+    for ch_info in ch_infos:
+        if event.gpio_event_added(ch_info.gpio_chip, ch_info.channel):
+            raise RuntimeError("Conflicting edge detection event already exists "
+                               "for this GPIO channel")
+
+    try:
+        waits = []
+        for ch_info in ch_infos:
+            line_group = _request_edge_line(ch_info, cdev_edge, debounce_us)
+            waits.append((line_group.fd, ch_info.gpio_chip, ch_info.channel))
+        # Bounces debounced by the kernel never reach the waiter
+        if gpio_cdev.kernel_debounce():
+            debounce_us = None
+        result = event.blocking_wait_for_any_edge(waits, debounce_us, timeout_s)
+    finally:
+        for ch_info in ch_infos:
+            _restore_line(ch_info)
+
+    # If error occurs, result == -1 means a channel is registered for
+    # conflicting edge detection, result == -2 means an error occurred while
+    # registering events or polling
+    if result == -1:
+        raise RuntimeError("Conflicting edge detection event already exists "
+                           "for this GPIO channel")
+
+    elif result == -2:
+        raise RuntimeError("Error waiting for edge")
+
+    elif not result:
+        return None
+
+    return [EdgeEvent(channel, _EVENT_EDGES[event_id], timestamp_ns, seqno)
+            for channel, event_id, timestamp_ns, seqno in result]
+
+
+# Arm the edge detection of an input channel for a waiter that reads the event
+# handle of the channel itself, returning the file descriptor of the handle
+def _arm_edge_wait(ch_info, edge, bouncetime_us):
+    if event.gpio_event_added(ch_info.gpio_chip, ch_info.channel):
+        raise RuntimeError("Conflicting edge detection event already exists "
+                           "for this GPIO channel")
+
+    try:
+        line_group = _request_edge_line(ch_info, edge, bouncetime_us)
+        if not event.add_edge_wait(line_group.fd, ch_info.gpio_chip, ch_info.channel, bouncetime_us):
+            raise RuntimeError("Conflicting edge detection event already exists "
+                               "for this GPIO channel")
+    except:
+        _restore_line(ch_info)
+        raise
+
+    return line_group.fd
+
+
+def _disarm_edge_wait(ch_info):
+    event.remove_edge_detect(ch_info.gpio_chip, ch_info.channel)
+    _restore_line(ch_info)
+
+
+# Read the events pending on the event handle of a channel, as EdgeEvent
+# objects. seqnos holds the count of the events of each channel, for the v1
+# uAPI which does not number them
+def _read_edge_events(ch_info, fd, buf, seqnos):
+    edge_events = []
+    for timestamp_ns, event_id, line_seqno in gpio_cdev.read_events(fd, buf):
+        seqno = seqnos[ch_info.channel] = (
+            line_seqno if line_seqno is not None else seqnos[ch_info.channel] + 1)
+        if event_id not in _EVENT_EDGES:
+            raise RuntimeError("Error waiting for edge")
+        edge_events.append(EdgeEvent(ch_info.channel, _EVENT_EDGES[event_id], timestamp_ns, seqno))
+    return edge_events
+
+
+# Coroutine used to wait for an edge event without blocking the asyncio event
+# loop. The event handle of the channel is watched by the loop itself, so no
+# thread is involved. The parameters and the result are the same as
+# wait_for_edge().
+async def async_wait_for_edge(channel, edge, bouncetime=None, timeout=None, bouncetime_us=None,
+                              timeout_ms=None, timeout_ns=None):
+    ch_info, edge, bouncetime_us, timeout = _wait_for_edge_args(
+        channel, edge, bouncetime, bouncetime_us, timeout, timeout_ms, timeout_ns)
+
+    loop = asyncio.get_running_loop()
+    fd = _arm_edge_wait(ch_info, edge, bouncetime_us)
+    try:
+        readable = loop.create_future()
+        loop.add_reader(fd, lambda: readable.done() or readable.set_result(None))
+        try:
+            await asyncio.wait_for(readable, timeout)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            loop.remove_reader(fd)
+
+        _read_edge_events(ch_info, fd, gpio_cdev.event_buffer(), {channel: 0})
+    finally:
+        _disarm_edge_wait(ch_info)
+
+    return channel
+
+
+# Asynchronous generator used to stream the edge events of one or more input
+# channels as EdgeEvent objects, in the asyncio event loop. Param channels can
+# be an integer or a non-empty list/tuple of distinct integers, edge must be
+# RISING, FALLING or BOTH. The event handles are watched by the loop itself, so
+# no thread is involved. The edge detection of the channels is removed once the generator
+# is closed.
+async def edge_events(channels, edge=BOTH, bouncetime=None, bouncetime_us=None):
+    ch_infos = _wait_for_edge_channels(channels)
+    cdev_edge, debounce_us, _ = _wait_for_edge_params(edge, bouncetime, bouncetime_us, None)
+
+    loop = asyncio.get_running_loop()
+    buf = gpio_cdev.event_buffer()
+    seqnos = dict((ch_info.channel, 0) for ch_info in ch_infos)
+    pending = collections.deque()
+    ready = asyncio.Event()
+    failure = []
+
+    # The kernel debounces the edges where it supports it, otherwise they are
+    # debounced here by their timestamps. The v1 uAPI of kernels before 5.7
+    # stamps the events with the wall clock, an event stamped before the last
+    # one kept is debounced by the monotonic time it is read at if it is the
+    # first of its read, and kept otherwise
+    debounce_ns = None
+    if debounce_us and not gpio_cdev.kernel_debounce():
+        debounce_ns = debounce_us * 1000
+    # the timestamp and the read time of the last event kept of each channel
+    lastcalls = {}
+
+    def _on_readable(ch_info, fd):
+        try:
+            edge_events = _read_edge_events(ch_info, fd, buf, seqnos)
+        except Exception as e:
+            failure.append(e)
+            ready.set()
+            return
+
+        now_ns = time.monotonic_ns()
+        for index, edge_event in enumerate(edge_events):
+            if debounce_ns is not None:
+                lastcall = lastcalls.get(ch_info.channel, None)
+                if lastcall is not None:
+                    elapsed_ns = edge_event.timestamp_ns - lastcall[0]
+                    if elapsed_ns < 0 and index == 0:
+                        elapsed_ns = now_ns - lastcall[1]
+                    if 0 <= elapsed_ns <= debounce_ns:
+                        continue
+                lastcalls[ch_info.channel] = (edge_event.timestamp_ns, now_ns)
+            pending.append(edge_event)
+        ready.set()
+
+    armed = []
+    try:
+        for ch_info in ch_infos:
+            fd = _arm_edge_wait(ch_info, cdev_edge, debounce_us)
+            armed.append((ch_info, fd))
+            loop.add_reader(fd, _on_readable, ch_info, fd)
+
+        while True:
+            while pending:
+                yield pending.popleft()
+            if failure:
+                raise failure[0]
+            await ready.wait()
+            ready.clear()
+    finally:
+        for ch_info, fd in armed:
+            loop.remove_reader(fd)
+            _disarm_edge_wait(ch_info)
+
+
 # Function used to check the currently set function of the channel specified.
 # Param channel must be an integers. The function returns either IN, OUT,
 # or UNKNOWN
@@ -621,3 +1231,134 @@ class PWM(object):
         if stop or start:
             _enable_pwm(self._ch_info)
             self._started = True
+
+
+# A channel that has already been validated, as returned by get_handle().
+# set(), get() and toggle() go straight to the line handle of the channel.
+class PinHandle(object):
+    def __init__(self, ch_info, direction):
+        self._ch_info = ch_info
+        self._direction = direction
+
+    def _invalidate(self):
+        self._ch_info = None
+
+    @property
+    def channel(self):
+        if self._ch_info is None:
+            return None
+        return self._ch_info.channel
+
+    def _output_info(self):
+        ch_info = self._ch_info
+        if ch_info is None:
+            raise RuntimeError("The GPIO handle has been invalidated by cleanup()")
+        if self._direction != OUT:
+            raise RuntimeError("The GPIO channel has not been set up as an "
+                               "OUTPUT")
+        return ch_info
+
+    def set(self, value):
+        ch_info = self._output_info()
+        gpio_cdev.set_value(ch_info.line_group, ch_info.line_index, value)
+
+    def toggle(self):
+        ch_info = self._output_info()
+        return gpio_cdev.toggle_value(ch_info.line_group, ch_info.line_index)
+
+    def get(self):
+        ch_info = self._ch_info
+        if ch_info is None:
+            raise RuntimeError("The GPIO handle has been invalidated by cleanup()")
+        return gpio_cdev.get_value(ch_info.line_group, ch_info.line_index)
+
+
+# A group of channels read and written as the bits of an integer word. Bit N
+# of the word maps to the Nth channel of the channels list/tuple. The channels
+# are set up by the constructor with the given direction and initial word
+# (outputs only). The line handles and bit positions are resolved once, so
+# read() and write() only issue one request per line handle.
+class Port(object):
+    def __init__(self, channels, direction, initial=None, consumer='Jetson-gpio'):
+        self._channels = list(_make_iterable(channels))
+
+        if direction == OUT and initial is not None:
+            initial = [(initial >> bit) & 1 for bit in range(len(self._channels))]
+        setup(self._channels, direction, initial=initial, consumer=consumer)
+
+        self._direction = direction
+        self._resolve_groups()
+
+    # Resolve the line handles of the channels and the lookup tables that map
+    # the bits of the value to their lines. Each byte of the word is translated
+    # through lookup tables into the values of the contiguous ranges of lines
+    # its bits map to, and back
+    def _resolve_groups(self):
+        # (line index, bit position) of the lines of each line handle
+        group_lines = {}
+        for bit, channel in enumerate(self._channels):
+            ch_info = _channel_data[channel]
+            group_lines.setdefault(ch_info.line_group, []).append((ch_info.line_index, bit))
+
+        groups = []
+        for line_group, lines in group_lines.items():
+            lines.sort()
+            tables = []
+            for shift in range(0, len(self._channels), 8):
+                runs = []
+                for index, bit in lines:
+                    if not shift <= bit < shift + 8:
+                        continue
+                    if runs and runs[-1][-1][0] == index - 1:
+                        runs[-1].append((index, bit))
+                    else:
+                        runs.append([(index, bit)])
+                for run in runs:
+                    byte_bits = [bit - shift for _, bit in run]
+                    write_table = tuple(tuple((byte >> b) & 1 for b in byte_bits)
+                                        for byte in range(256))
+                    read_table = dict((bytes(write_table[byte]), byte) for byte in range(256)
+                                      if byte & ~sum(1 << b for b in byte_bits) == 0)
+                    tables.append((shift, run[0][0], run[-1][0] + 1, write_table, read_table))
+            groups.append((line_group, tables))
+        self._groups = groups
+
+    @property
+    def channels(self):
+        return tuple(self._channels)
+
+    # The line handles of the channels are replaced when one of them is set up,
+    # cleaned up or detects edges again. Resolve them again as long as all the
+    # channels are still set up in the direction of the Port
+    def _check_groups(self):
+        if all(line_group.fd is not None for line_group, _ in self._groups):
+            return
+
+        for channel in self._channels:
+            ch_info = _channel_data[channel]
+            direction = _app_channel_configuration(ch_info)
+            if direction is None or ch_info.line_group is None:
+                raise RuntimeError("The channels of this Port have been cleaned up")
+            if direction != self._direction:
+                raise RuntimeError("A channel of this Port has been set up as another direction")
+
+        self._resolve_groups()
+
+    def write(self, value):
+        if self._direction != OUT:
+            raise RuntimeError("The Port has not been set up as an OUTPUT")
+
+        self._check_groups()
+        for line_group, tables in self._groups:
+            gpio_cdev.set_value_ranges(line_group, [
+                (start, write_table[(value >> shift) & 0xFF])
+                for shift, start, _, write_table, _ in tables])
+
+    def read(self):
+        self._check_groups()
+        value = 0
+        for line_group, tables in self._groups:
+            data = gpio_cdev.get_values(line_group)
+            for shift, start, end, _, read_table in tables:
+                value |= read_table[data[start:end]] << shift
+        return value
@@ -31,12 +31,15 @@ import ctypes
 from dataclasses import dataclass
 import mmap
 import sys
+import threading
 import warnings
 from Jetson.GPIO.gpio_pin_data import ChannelInfo
 from Jetson.GPIO.constants import OUT, HARD_PWM
 
 GPIO_HIGH = 1
 
+GPIOHANDLES_MAX = 64
+
 GPIOHANDLE_REQUEST_INPUT = 0x1
 GPIOHANDLE_REQUEST_OUTPUT = 0x2
 
@@ -51,6 +54,32 @@ GPIOHANDLE_GET_LINE_VALUES_IOCTL = 0xC040B408
 GPIOHANDLE_SET_LINE_VALUES_IOCTL = 0xC040B409
 GPIO_GET_LINEEVENT_IOCTL = 0xC030B404
 
+GPIOEVENT_EVENT_RISING_EDGE = 0x1
+GPIOEVENT_EVENT_FALLING_EDGE = 0x2
+
+# GPIO character device uAPI v2 (Linux 5.10 and later)
+GPIO_V2_LINES_MAX = 64
+GPIO_V2_LINE_NUM_ATTRS_MAX = 10
+
+GPIO_V2_LINE_FLAG_INPUT = 1 << 2
+GPIO_V2_LINE_FLAG_OUTPUT = 1 << 3
+GPIO_V2_LINE_FLAG_EDGE_RISING = 1 << 4
+GPIO_V2_LINE_FLAG_EDGE_FALLING = 1 << 5
+
+GPIO_V2_LINE_ATTR_ID_FLAGS = 1
+GPIO_V2_LINE_ATTR_ID_OUTPUT_VALUES = 2
+GPIO_V2_LINE_ATTR_ID_DEBOUNCE = 3
+
+# Number of edge events the kernel buffers for an event line, the largest
+# size it accepts
+GPIO_V2_EVENT_BUFFER_SIZE = GPIO_V2_LINES_MAX * 16
+
+GPIO_V2_GET_LINEINFO_IOCTL = 0xC100B405
+GPIO_V2_GET_LINE_IOCTL = 0xC250B407
+GPIO_V2_LINE_SET_CONFIG_IOCTL = 0xC110B40D
+GPIO_V2_LINE_GET_VALUES_IOCTL = 0xC010B40E
+GPIO_V2_LINE_SET_VALUES_IOCTL = 0xC010B40F
+
 # @brief the information about a GPIO chip
 # @name: the Linux kernel name of the chip
 # @label: a name for the chip
@@ -140,6 +169,107 @@ class gpioevent_data(ctypes.Structure):
         ('id', ctypes.c_uint32),
     ]
 
+# @brief values of a subset of the lines of a v2 line request
+# @bits: a bitmap of the line values, bit N for the Nth requested line
+# @mask: a bitmap of the lines to get or set
+class gpio_v2_line_values(ctypes.Structure):
+    _fields_ = [
+        ('bits', ctypes.c_uint64),
+        ('mask', ctypes.c_uint64),
+    ]
+
+class _gpio_v2_line_attribute_value(ctypes.Union):
+    _fields_ = [
+        ('flags', ctypes.c_uint64),
+        ('values', ctypes.c_uint64),
+        ('debounce_period_us', ctypes.c_uint32),
+    ]
+
+# @brief a configurable attribute of a v2 line
+# @id: attribute identifier, one of GPIO_V2_LINE_ATTR_ID_*
+# @flags, @values, @debounce_period_us: the attribute value, by @id
+class gpio_v2_line_attribute(ctypes.Structure):
+    _anonymous_ = ('value',)
+    _fields_ = [
+        ('id', ctypes.c_uint32),
+        ('padding', ctypes.c_uint32),
+        ('value', _gpio_v2_line_attribute_value),
+    ]
+
+# @brief a line attribute applied to a subset of the requested lines
+# @attr: the attribute
+# @mask: a bitmap of the lines the attribute applies to
+class gpio_v2_line_config_attribute(ctypes.Structure):
+    _fields_ = [
+        ('attr', gpio_v2_line_attribute),
+        ('mask', ctypes.c_uint64),
+    ]
+
+# @brief the configuration of the lines of a v2 line request
+# @flags: flags of the lines without an overriding flags attribute
+# @num_attrs: the number of attributes in @attrs
+# @attrs: the attributes applied to subsets of the lines
+class gpio_v2_line_config(ctypes.Structure):
+    _fields_ = [
+        ('flags', ctypes.c_uint64),
+        ('num_attrs', ctypes.c_uint32),
+        ('padding', ctypes.c_uint32 * 5),
+        ('attrs', gpio_v2_line_config_attribute * GPIO_V2_LINE_NUM_ATTRS_MAX),
+    ]
+
+# @brief a v2 request for one or more lines of a chip
+# @offsets: an array of lines, specified by offset index
+# @consumer: a label for the selected GPIO lines
+# @config: the configuration of the lines
+# @num_lines: number of lines requested in this request
+# @event_buffer_size: number of edge events the kernel buffers, 0 for the
+# default
+# @fd: contains a valid file handle on success
+class gpio_v2_line_request(ctypes.Structure):
+    _fields_ = [
+        ('offsets', ctypes.c_uint32 * GPIO_V2_LINES_MAX),
+        ('consumer', ctypes.c_char * 32),
+        ('config', gpio_v2_line_config),
+        ('num_lines', ctypes.c_uint32),
+        ('event_buffer_size', ctypes.c_uint32),
+        ('padding', ctypes.c_uint32 * 5),
+        ('fd', ctypes.c_int32),
+    ]
+
+# @brief the information about a v2 GPIO line
+# @name: the name of this GPIO line
+# @consumer: a functional name for the consumer of this GPIO line
+# @offset: the local offset on this GPIO chip
+# @num_attrs: the number of attributes in @attrs
+# @flags: flags for this line
+# @attrs: the configuration attributes of the line
+class gpio_v2_line_info(ctypes.Structure):
+    _fields_ = [
+        ('name', ctypes.c_char * 32),
+        ('consumer', ctypes.c_char * 32),
+        ('offset', ctypes.c_uint32),
+        ('num_attrs', ctypes.c_uint32),
+        ('flags', ctypes.c_uint64),
+        ('attrs', gpio_v2_line_attribute * GPIO_V2_LINE_NUM_ATTRS_MAX),
+        ('padding', ctypes.c_uint32 * 4),
+    ]
+
+# @brief an edge event pushed to userspace by a v2 line request
+# @timestamp_ns: best estimate of event occurrence's time (ns)
+# @id: event identifier, one of GPIOEVENT_EVENT_*
+# @offset: the offset of the line that triggered the event
+# @seqno: the sequence number of the event among all lines of the request
+# @line_seqno: the sequence number of the event on this line
+class gpio_v2_line_event(ctypes.Structure):
+    _fields_ = [
+        ('timestamp_ns', ctypes.c_uint64),
+        ('id', ctypes.c_uint32),
+        ('offset', ctypes.c_uint32),
+        ('seqno', ctypes.c_uint32),
+        ('line_seqno', ctypes.c_uint32),
+        ('padding', ctypes.c_uint32 * 6),
+    ]
+
 
 class GPIOError(IOError):
     """Base class for GPIO errors."""
@@ -179,19 +309,99 @@ def chip_check_info(label, gpio_device):
 
     return chip_fd
 
+# Dictionary used as a lookup table from GPIO chip label to its character
+# device, built once per process and rebuilt when an entry turns out stale
+# key: chip label, value: device path
+_chip_devices = {}
+
+# @brief read the label of a chip through its character device
+# @param[in] gpio_device: path of the character device of the chip
+# @param[out] the label of the chip
+def chip_label(gpio_device):
+    chip_fd = chip_open(gpio_device)
+
+    chip_info = gpiochip_info()
+    try:
+        fcntl.ioctl(chip_fd, GPIO_GET_CHIPINFO_IOCTL, chip_info)
+    except (OSError, IOError) as e:
+        raise GPIOError(e.errno, "Querying GPIO chip info: " + e.strerror)
+    finally:
+        close_chip(chip_fd)
+
+    return chip_info.label.decode()
+
+# @brief rebuild the lookup table from chip label to character device. The
+# labels are read from sysfs where the kernel exposes them, the remaining
+# chips are opened and queried
+def _index_chip_devices():
+    dev = '/dev/'
+    sysfs = '/sys/bus/gpio/devices/'
+
+    _chip_devices.clear()
+    for device in os.listdir(dev):
+        if not device.startswith('gpiochip'):
+            continue
+
+        try:
+            with open(sysfs + device + '/label', 'r') as f:
+                label = f.read().strip()
+        except (OSError, IOError):
+            label = chip_label(dev + device)
+
+        _chip_devices[label] = dev + device
+
+# The uAPI version of the GPIO character device, detected when the first chip
+# is opened: True if the kernel supports v2, False for v1 only
+_uapi_v2 = None
+
+# @brief detect whether the kernel supports the v2 uAPI through a chip
+# @param[in] chip_fd: the file descriptor of the chip
+def _detect_uapi(chip_fd):
+    global _uapi_v2
+
+    if _uapi_v2 is not None:
+        return
+
+    line_info = gpio_v2_line_info()
+    try:
+        fcntl.ioctl(chip_fd, GPIO_V2_GET_LINEINFO_IOCTL, line_info)
+        _uapi_v2 = True
+    except (OSError, IOError):
+        _uapi_v2 = False
+
+# @brief check which uAPI version the line requests use
+# @param[out] True for v2, False for v1
+def uapi_v2():
+    return bool(_uapi_v2)
+
 # @brief open a chip by its label
 # @param[in] label: 
 # @param[out] the file descriptor of the chip
 def chip_open_by_label(label):
-    dev = '/dev/'
-    for device in os.listdir(dev):
-        if device.startswith('gpiochip'):
-            gpio_device = dev + device
+    chip_fd = _chip_open_by_label(label)
+    _detect_uapi(chip_fd)
+
+    return chip_fd
+
+def _chip_open_by_label(label):
+    gpio_device = _chip_devices.get(label, None)
+    if gpio_device is not None:
+        # The table is revalidated lazily: a chip that is gone or whose device
+        # now belongs to another chip triggers a rebuild
+        try:
             chip_fd = chip_check_info(label, gpio_device)
-            if chip_fd != None:
-                break
+        except GPIOError:
+            chip_fd = None
+        if chip_fd is not None:
+            return chip_fd
+
+    _index_chip_devices()
+    gpio_device = _chip_devices.get(label, None)
+    if gpio_device is None:
+        raise Exception("{}: No such gpio device registered".format(label))
 
-    if chip_fd == None:
+    chip_fd = chip_check_info(label, gpio_device)
+    if chip_fd is None:
         raise Exception("{}: No such gpio device registered".format(label))
 
     return chip_fd
@@ -207,18 +417,106 @@ def close_chip(chip_fd):
     except (OSError, IOError) as e:
         pass
 
-# @brief open a line of a chip
-# @param[in] ch_info: ChannelInfo object of the channel desired to open
-# @param[out] the file descriptor of the line
-def open_line(ch_info, request):
-    
+# @brief the lines of a chip requested together through one line handle
+# @fd the file descriptor of the line handle
+# @offsets the line offsets, in the order they were requested
+# @direction the cdev direction flag shared by all the lines
+# @consumer the consumer label of the lines
+# @edge the edge (GPIOEVENT_REQUEST_*) whose events the handle reports, or
+# None if it does not detect edges
+# @values the last values written to the lines. A v1 set request always
+# carries the values of every line of the handle, so the values of the
+# lines not being written are taken from here
+# @data the buffer the get requests of the handle read the values into
+# @set_data the buffer of the masked v2 set requests
+# @lock serializes the requests of the handle, which share the buffers,
+# across threads
+class LineGroup(object):
+    def __init__(self, fd, offsets, direction, consumer, values, edge=None, debounce_us=0):
+        self.fd = fd
+        self.offsets = offsets
+        self.direction = direction
+        self.consumer = consumer
+        self.edge = edge
+        self.debounce_us = debounce_us
+        self.values = gpiohandle_data()
+        for i, value in enumerate(values):
+            self.values.values[i] = value
+        if _uapi_v2:
+            self.data = gpio_v2_line_values()
+            self.set_data = gpio_v2_line_values()
+        else:
+            self.data = gpiohandle_data()
+            self.set_data = None
+        self.lock = threading.Lock()
+
+# @brief open the lines described by a request struct
+# @param[in] chip_fd: the file descriptor of the chip
+# @param[in] request: the request struct built by request_handle()
+# @param[out] the LineGroup object of the line handle
+def open_lines(chip_fd, request):
+    if _uapi_v2:
+        try:
+            fcntl.ioctl(chip_fd, GPIO_V2_GET_LINE_IOCTL, request)
+        except (OSError, IOError) as e:
+            raise GPIOError(e.errno, "Opening line request: " + e.strerror)
+        # an input line request may detect edges later on
+        _set_nonblocking(request.fd)
+
+        num_lines = request.num_lines
+        if request.config.flags & GPIO_V2_LINE_FLAG_OUTPUT:
+            direction = GPIOHANDLE_REQUEST_OUTPUT
+            bits = request.config.attrs[0].attr.values
+        else:
+            direction = GPIOHANDLE_REQUEST_INPUT
+            bits = 0
+        return LineGroup(request.fd, list(request.offsets[:num_lines]),
+                         direction, request.consumer.decode(),
+                         [(bits >> i) & 1 for i in range(num_lines)])
+
     try:
-        fcntl.ioctl(ch_info.chip_fd, GPIO_GET_LINEHANDLE_IOCTL, request)
-        
+        fcntl.ioctl(chip_fd, GPIO_GET_LINEHANDLE_IOCTL, request)
     except (OSError, IOError) as e:
         raise GPIOError(e.errno, "Opening output line handle: " + e.strerror)
 
-    ch_info.line_handle = request.fd
+    return LineGroup(request.fd,
+                     list(request.lineoffsets[:request.lines]),
+                     request.flags, request.consumer_label.decode(),
+                     request.default_values[:request.lines])
+
+# @brief open the line described by a request event struct
+# @param[in] chip_fd: the file descriptor of the chip
+# @param[in] request: the request struct built by request_event()
+# @param[in] edge: the edge the request detects
+# @param[in] debounce_us: the debounce period the request was built with (us)
+# @param[out] the LineGroup object of the event handle, which also reads the
+# value of the line
+def open_event_line(chip_fd, request, edge, debounce_us=0):
+    if _uapi_v2:
+        ioctl_request, offset, consumer = GPIO_V2_GET_LINE_IOCTL, request.offsets[0], request.consumer
+    else:
+        ioctl_request, offset, consumer = GPIO_GET_LINEEVENT_IOCTL, request.lineoffset, request.consumer_label
+
+    try:
+        fcntl.ioctl(chip_fd, ioctl_request, request)
+    except (OSError, IOError) as e:
+        raise GPIOError(e.errno, "Opening input line event handle: " + e.strerror)
+    _set_nonblocking(request.fd)
+
+    return LineGroup(request.fd, [offset], GPIOHANDLE_REQUEST_INPUT,
+                     consumer.decode(), [], edge, debounce_us)
+
+# @brief make the reads of an event handle return at once when no event is
+# pending, so that a stale readiness never blocks the reader. The handle is
+# closed if this fails
+# @param[in] event_fd: file descriptor of the event handle
+def _set_nonblocking(event_fd):
+    try:
+        flags = fcntl.fcntl(event_fd, fcntl.F_GETFL)
+        fcntl.fcntl(event_fd, fcntl.F_SETFL, flags | os.O_NONBLOCK)
+    except (OSError, IOError) as e:
+        os.close(event_fd)
+        raise GPIOError(e.errno, "Configuring event handle: " + e.strerror)
 
 # @brief close a line
 # @param[in] line_handle: the file descriptor of the line
@@ -231,31 +529,96 @@ def close_line(line_handle):
     except OSError as e:
         raise GPIOError(e.errno, "Closing existing GPIO line: " + e.strerror)
 
-# @brief build a request handle struct
-# @param[in] line_offset: the offset of the line to its chip
-# @param[in] direction: the direction of the line (in or out)
-# @param[in] initial: initial value of the line
-# @param[in] consumer: the consumer label that uses the line
-# @param[out] the request handle struct
-def request_handle(line_offset, direction, initial, consumer):
+# @brief build a request struct for one or more lines of a chip
+# @param[in] line_offsets: the offsets of the lines to their chip
+# @param[in] direction: the direction of the lines (in or out)
+# @param[in] initials: initial values of the lines, one per line
+# @param[in] consumer: the consumer label that uses the lines
+# @param[out] the request struct
+def request_handle(line_offsets, direction, initials, consumer):
+    if len(line_offsets) > GPIOHANDLES_MAX:
+        raise ValueError("A line handle holds at most %d lines" % GPIOHANDLES_MAX)
+
+    values = []
+    for initial in initials:
+        if direction == GPIOHANDLE_REQUEST_OUTPUT:
+            values.append(initial if initial is not None else GPIO_HIGH)
+        elif initial is not None:
+            raise ValueError("initial parameter is not valid for inputs")
+
+    if _uapi_v2:
+        request = gpio_v2_line_request()
+        request.offsets[:len(line_offsets)] = line_offsets
+        request.consumer = consumer.encode()
+        request.num_lines = len(line_offsets)
+        if direction == GPIOHANDLE_REQUEST_OUTPUT:
+            request.config.flags = GPIO_V2_LINE_FLAG_OUTPUT
+            attr = request.config.attrs[0]
+            attr.attr.id = GPIO_V2_LINE_ATTR_ID_OUTPUT_VALUES
+            attr.attr.values = sum(1 << i for i, value in enumerate(values) if value)
+            attr.mask = (1 << len(line_offsets)) - 1
+            request.config.num_attrs = 1
+        else:
+            request.config.flags = GPIO_V2_LINE_FLAG_INPUT
+            # The kernel sizes the event buffer of a line request when it is
+            # made, edge detection switched on later with SET_CONFIG uses it
+            request.event_buffer_size = GPIO_V2_EVENT_BUFFER_SIZE
+        return request
+
     request = gpiohandle_request()
-    request.lineoffsets[0] = line_offset
+    request.lineoffsets[:len(line_offsets)] = line_offsets
+    request.default_values[:len(values)] = values
     request.flags = direction
-    if direction == GPIOHANDLE_REQUEST_OUTPUT:
-        request.default_values[0] = initial if initial is not None else GPIO_HIGH
-    else:
-        if initial is not None:
-            raise ValueError("initial parameter is not valid for inputs")
     request.consumer_label = consumer.encode()
-    request.lines = 1
+    request.lines = len(line_offsets)
 
     return request
 
+# @brief convert a v1 event request edge into v2 line flags
+def _edge_flags_v2(edge):
+    flags = GPIO_V2_LINE_FLAG_INPUT
+    if edge is not None and edge & GPIOEVENT_REQUEST_RISING_EDGE:
+        flags |= GPIO_V2_LINE_FLAG_EDGE_RISING
+    if edge is not None and edge & GPIOEVENT_REQUEST_FALLING_EDGE:
+        flags |= GPIO_V2_LINE_FLAG_EDGE_FALLING
+    return flags
+
+# @brief fill the v2 line config of a single input line
+# @param[in] config: the gpio_v2_line_config struct to fill
+# @param[in] edge: the edge to detect, or None
+# @param[in] debounce_us: the period the line must be stable for before an
+# edge is reported (us), 0 for no debouncing
+def _edge_config_v2(config, edge, debounce_us):
+    config.flags = _edge_flags_v2(edge)
+    if debounce_us:
+        attr = config.attrs[0]
+        attr.attr.id = GPIO_V2_LINE_ATTR_ID_DEBOUNCE
+        attr.attr.debounce_period_us = debounce_us
+        attr.mask = 1
+        config.num_attrs = 1
+
+# @brief check whether the kernel debounces event lines itself
+# @param[out] True if the debounce_us of request_event() and set_edge() is
+# applied, False if the caller must debounce the events
+def kernel_debounce():
+    return bool(_uapi_v2)
+
 # @brief build a request event struct
 # @param[in] line_offset: the offset of the line to its chip
 # @param[in] edge: event's detection edge 
 # @param[in] consumer: the consumer label that uses the line
-def request_event(line_offset, edge, consumer):
+# @param[in] debounce_us: the period the line must be stable for before an
+# edge is reported (us), 0 for no debouncing. Ignored by v1 kernels
+def request_event(line_offset, edge, consumer, debounce_us=0):
+    if _uapi_v2:
+        request = gpio_v2_line_request()
+        request.offsets[0] = line_offset
+        request.consumer = consumer.encode()
+        _edge_config_v2(request.config, edge, debounce_us)
+        request.num_lines = 1
+        request.event_buffer_size = GPIO_V2_EVENT_BUFFER_SIZE
+        return request
+
     request = gpioevent_request()
     request.lineoffset = line_offset
     request.handleflags = GPIOHANDLE_REQUEST_INPUT
@@ -263,30 +626,218 @@ def request_event(line_offset, edge, consumer):
     request.consumer_label = consumer.encode()
     return request
 
-# @brief read the value of a line
-# @param[in] line_handle: file descriptor of the line
-# @param[out] the value of the line
-def get_value(line_handle):
-    data = gpiohandle_data()
+# @brief change the edge an input line handle detects, in place (v2 only)
+# @param[in] line_group: LineGroup object of the line handle
+# @param[in] edge: the edge to detect, or None to stop detecting edges
+# @param[in] debounce_us: the period the line must be stable for before an
+# edge is reported (us), 0 for no debouncing
+def set_edge(line_group, edge, debounce_us=0):
+    config = gpio_v2_line_config()
+    _edge_config_v2(config, edge, debounce_us)
+
+    with line_group.lock:
+        try:
+            fcntl.ioctl(line_group.fd, GPIO_V2_LINE_SET_CONFIG_IOCTL, config)
+        except (OSError, IOError) as e:
+            raise GPIOError(e.errno, "Configuring line edge detection: " + e.strerror)
+
+        line_group.edge = edge
+        line_group.debounce_us = debounce_us
+
+        # The events buffered before edge detection stopped would otherwise be
+        # reported once it starts again
+        if edge is None:
+            drain_events(line_group.fd)
+
+# @brief read one edge event from an event handle, without blocking
+# @param[in] event_fd: file descriptor of the event handle
+# @param[out] a tuple of the event timestamp (ns), the event id
+# (GPIOEVENT_EVENT_*) and the sequence number of the event on its line, which
+# is None for v1 events, None if no event is pending
+def read_event(event_fd):
+    event_type = gpio_v2_line_event if _uapi_v2 else gpioevent_data
 
     try:
-        fcntl.ioctl(line_handle, GPIOHANDLE_GET_LINE_VALUES_IOCTL, data)
-    except (OSError, IOError) as e:
-        raise GPIOError(e.errno, "Getting line value: " + e.strerror)
+        data = os.read(event_fd, ctypes.sizeof(event_type))
+    except BlockingIOError:
+        return None
+    except OSError as e:
+        raise GPIOError(e.errno, "Reading GPIO event: " + e.strerror)
+
+    event_data = event_type.from_buffer_copy(data)
+    if _uapi_v2:
+        return event_data.timestamp_ns, event_data.id, event_data.line_seqno
+    return event_data.timestamp, event_data.id, None
+
+# @brief allocate a buffer for read_events()
+# @param[out] a ctypes array of GPIO_V2_EVENT_BUFFER_SIZE event structs
+def event_buffer():
+    event_type = gpio_v2_line_event if _uapi_v2 else gpioevent_data
+    return (event_type * GPIO_V2_EVENT_BUFFER_SIZE)()
+
+# @brief read the events pending on an event handle in bulk, without blocking.
+# The kernel returns as many events as it has pending and the buffer holds in
+# one read
+# @param[in] event_fd: file descriptor of the event handle
+# @param[in] buf: the buffer allocated by event_buffer()
+# @param[out] a list of tuples of the event timestamp (ns), the event id
+# (GPIOEVENT_EVENT_*) and the sequence number of the event on its line, which
+# is None for v1 events, empty if no event is pending
+def read_events(event_fd, buf):
+    events = []
+    while True:
+        try:
+            size = os.readv(event_fd, [buf])
+        except BlockingIOError:
+            return events
+        except OSError as e:
+            raise GPIOError(e.errno, "Reading GPIO events: " + e.strerror)
+
+        count = size // ctypes.sizeof(buf._type_)
+        if _uapi_v2:
+            events.extend((event.timestamp_ns, event.id, event.line_seqno)
+                          for event in buf[:count])
+        else:
+            events.extend((event.timestamp, event.id, None) for event in buf[:count])
+
+        # A full buffer may have left events behind
+        if count < len(buf):
+            return events
+
+# @brief read and discard the events pending on an event handle, without
+# blocking
+# @param[in] event_fd: file descriptor of the event handle
+def drain_events(event_fd):
+    while read_event(event_fd) is not None:
+        pass
 
-    return data.values[0]
+# @brief write the values of a subset of the lines of a v2 line request. The
+# caller holds the lock of the line handle
+def _set_values_v2(line_group, bits, mask):
+    line_group.set_data.bits = bits
+    line_group.set_data.mask = mask
 
-# @brief write the value of a line
-# @param[in] line_handle: file descriptor of the line
-# @param[in] value: the value to set the line
-def set_value(line_handle, value):
-    data = gpiohandle_data()
-    data.values[0] = value
+    try:
+        fcntl.ioctl(line_group.fd, GPIO_V2_LINE_SET_VALUES_IOCTL, line_group.set_data, True)
+    except (OSError, IOError) as e:
+        raise GPIOError(e.errno, "Setting line values: " + e.strerror)
+
+# @brief write the values of all the lines of a v1 line handle. The caller
+# holds the lock of the line handle
+def _set_values_v1(line_group):
+    try:
+        fcntl.ioctl(line_group.fd, GPIOHANDLE_SET_LINE_VALUES_IOCTL, line_group.values, True)
+    except (OSError, IOError) as e:
+        raise GPIOError(e.errno, "Setting line values: " + e.strerror)
+
+# @brief read the values of the lines of a line handle into its buffer. The
+# caller holds the lock of the line handle
+# @param[in] mask: a bitmap of the lines to read (v2 only)
+def _get_values(line_group, mask):
+    if _uapi_v2:
+        line_group.data.mask = mask
+        ioctl_request = GPIO_V2_LINE_GET_VALUES_IOCTL
+    else:
+        ioctl_request = GPIOHANDLE_GET_LINE_VALUES_IOCTL
 
     try:
-        fcntl.ioctl(line_handle, GPIOHANDLE_SET_LINE_VALUES_IOCTL, data)
+        fcntl.ioctl(line_group.fd, ioctl_request, line_group.data, True)
     except (OSError, IOError) as e:
-        raise GPIOError(e.errno, "Setting line value: " + e.strerror)
+        raise GPIOError(e.errno, "Getting line values: " + e.strerror)
+
+# @brief read the value of a line
+# @param[in] line_group: LineGroup object of the line handle
+# @param[in] index: the index of the line in its line handle
+# @param[out] the value of the line
+def get_value(line_group, index):
+    with line_group.lock:
+        _get_values(line_group, 1 << index)
+
+        if _uapi_v2:
+            return (line_group.data.bits >> index) & 1
+        return line_group.data.values[index]
+
+# @brief read the values of all the lines of a line handle at once
+# @param[in] line_group: LineGroup object of the line handle
+# @param[out] the values of the lines, indexed by their index in the handle
+def get_values(line_group):
+    num_lines = len(line_group.offsets)
+
+    with line_group.lock:
+        _get_values(line_group, (1 << num_lines) - 1)
+
+        if _uapi_v2:
+            bits = line_group.data.bits
+            return bytes((bits >> i) & 1 for i in range(num_lines))
+        return bytes(line_group.data.values)
+
+# @brief write the value of a line
+# @param[in] line_group: LineGroup object of the line handle
+# @param[in] index: the index of the line in its line handle
+# @param[in] value: the value to set the line
+def set_value(line_group, index, value):
+    with line_group.lock:
+        line_group.values.values[index] = value
+
+        if _uapi_v2:
+            _set_values_v2(line_group, (1 if value else 0) << index, 1 << index)
+        else:
+            _set_values_v1(line_group)
+
+# @brief invert the value of a line
+# @param[in] line_group: LineGroup object of the line handle
+# @param[in] index: the index of the line in its line handle
+# @param[out] the new value of the line
+def toggle_value(line_group, index):
+    with line_group.lock:
+        value = 0 if line_group.values.values[index] else GPIO_HIGH
+        line_group.values.values[index] = value
+
+        if _uapi_v2:
+            _set_values_v2(line_group, value << index, 1 << index)
+        else:
+            _set_values_v1(line_group)
+
+        return value
+
+# @brief write the values of several lines of a line handle at once
+# @param[in] line_group: LineGroup object of the line handle
+# @param[in] index_values: a list of (index, value) pairs, the index of a line
+# in its line handle and the value to set the line
+def set_values(line_group, index_values):
+    with line_group.lock:
+        bits = mask = 0
+        for index, value in index_values:
+            line_group.values.values[index] = value
+            mask |= 1 << index
+            if value:
+                bits |= 1 << index
+
+        if _uapi_v2:
+            _set_values_v2(line_group, bits, mask)
+        else:
+            _set_values_v1(line_group)
+
+# @brief write the values of contiguous ranges of lines of a line handle at once
+# @param[in] line_group: LineGroup object of the line handle
+# @param[in] ranges: a list of (start, values) pairs, the index of the first
+# line of a range in its line handle and the values to set the lines from there
+def set_value_ranges(line_group, ranges):
+    with line_group.lock:
+        for start, values in ranges:
+            line_group.values.values[start:start + len(values)] = values
+
+        if _uapi_v2:
+            # Only the lines of the ranges are written
+            bits = mask = 0
+            for start, values in ranges:
+                mask |= ((1 << len(values)) - 1) << start
+                for i, value in enumerate(values):
+                    if value:
+                        bits |= 1 << (start + i)
+            _set_values_v2(line_group, bits, mask)
+        else:
+            _set_values_v1(line_group)
 
 _GPIO_IN_OUT_MASK = (1 << 6) | (1 << 4)
 """
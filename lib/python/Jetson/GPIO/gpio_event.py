@@ -27,25 +27,19 @@
 # that enables users to add or remove an event in a blocking or non-blocking
 # mode. It keeps an global event dictionary that supports looking up a
 # channel's registered event.
-# @Note: Ideas for multiple channel detection
-#   1. polling for maxevents should not be specified
-#   2. Each thread should not share epoll instance
-
-# Python2 has module thread. Renamed to _thread in Python3
-try:
-    import thread
-except:
-    import _thread as thread
+# @Note: The event handles of all the channels with edge detection are
+#   registered in a single epoll instance, served by one dispatcher thread
 
+import collections
 import os
+import threading
+import traceback
 import warnings
-import fcntl
 import select
-import ctypes
 import time
 
 from Jetson.GPIO import gpio_cdev as cdev
-from datetime import datetime
+from Jetson.GPIO.constants import DROP_OLDEST, DROP_NEWEST
 
 try:
     InterruptedError = InterruptedError
@@ -59,156 +53,334 @@ RISING_EDGE = 1
 FALLING_EDGE = 2
 BOTH_EDGE = 3
 
-# Dictionary storing the epoll thread object
-# Key: channel (pin number), Value: Epoll object
-_epoll_fd_thread = {}
+# epoll object the dispatcher thread waits on, holding the event handles of
+# all the channels with edge detection. None while the dispatcher is not
+# running
+_epoll_obj = None
+
+# Dictionary used as a lookup table from the file descriptors registered in
+# _epoll_obj to their gpio object, which routes the events of the dispatcher
+# key: file descriptor of an event handle, value: GPIO class object
+_epoll_gpio_objs = {}
 
-# epoll blocking wait object
-_epoll_fd_blocking = None
+# the max time to wait for a new dispatcher thread to start (second)
+_DISPATCHER_START_TIMEOUT = 1
+
+# the threading.Thread object of the dispatcher thread, None while it is not
+# running
+_dispatcher_thread = None
+
+# set by the dispatcher thread once it waits for edge events
+_dispatcher_ready = None
+
+# read and write file descriptors of the pipe registered in _epoll_obj, written
+# to wake the dispatcher thread up once no event is left to detect. The
+# dispatcher waits for events without a timeout
+_wakeup_fds = None
 
 # 2-layered dictionary of GPIO class objects.
 # layer 1 key = chip name, layer 2 key = channel (pin number by mode)
 # value = GPIO class object
 _gpio_event_list = {}
 
-# Dictionary for thread to lookup to check its supposed state
-# Key: thread id, Value: true if it is supposed to be running state, otherwise false
-_thread_running_dict = {}
-
-# lock object for thread
-_mutex = thread.allocate_lock()
+# Lock of the registry: _gpio_event_list, _epoll_gpio_objs and the dispatcher
+# state. It is only held while an event is added or removed and while the
+# dispatcher checks whether it is still needed, the state of each channel's
+# event is guarded by the lock of its gpio object
+_registry_lock = threading.Lock()
 
 class _Gpios:
     # @value_fd the file descriptor for the chip line
-    # @initial_thread true if the thread just start up (within the first loop)
-    # @thread_added the number of threads being added to monitor this object/gpio
-    # @thread_id the id of the thread being created to detect event
-    # @bouncetime the time interval for debouncing
-    # @callbacks a list of callback functions to be executed when an edge event happened
-    # @lastcall the timestamp for counting debounce
+    # @thread_added true if the dispatcher thread monitors this object/gpio
+    # @bouncetime_us the time interval for debouncing (us), None if the kernel
+    # debounces the events or no debouncing is needed
+    # @callbacks a list of callback functions to be executed when an edge event happened,
+    # called with a tuple of the event id, timestamp (ns) and sequence number
+    # @seqno the sequence number of the last event read, which counts the events the
+    # kernel reported on the line
+    # @lastcall the monotonic time (ns) the last event not debounced was read at,
+    # None before the first event
+    # @lasttimestamp the kernel timestamp (ns) of the last event not debounced
     # @event_occurred true if an edge event occured
-    def __init__(self, line_fd, bouncetime=None):
+    # @queue a bounded deque of the tuples of the event id, timestamp (ns) and sequence
+    # number of the events not yet taken, None if the events are not queued
+    # @dropped the number of events dropped from a full queue
+    # @runner the _CallbackRunner object running the callbacks, None to run them in
+    # the dispatcher thread
+    # @removed true once the event is removed, after which its handle is not read
+    # @persistent true if the event is a wait kept armed between the waits, whose
+    # events read but not yet waited for are kept in queue
+    # @buf the event buffer of a persistent wait, allocated by its first read
+    # @lock the lock guarding the state above and the reads of the event handle
+    def __init__(self, line_fd, bouncetime_us=None, queue_size=None):
         self.value_fd = line_fd
-        self.initial_thread = True
         self.thread_added = False
-        self.thread_id = 0
-        self.thread_exited = False
-        self.bouncetime = bouncetime
+        self.bouncetime_us = bouncetime_us
         self.callbacks = []
-        self.lastcall = 0
+        self.seqno = 0
+        self.lastcall = None
+        self.lasttimestamp = None
         self.event_occurred = False
+        self.queue = collections.deque(maxlen=queue_size) if queue_size else None
+        self.dropped = 0
+        self.runner = None
+        self.removed = False
+        self.persistent = False
+        self.buf = None
+        self.lock = threading.Lock()
 
     def __del__(self):
         del self.callbacks
 
+# @brief Run the callbacks of a channel's events in an executor instead of the
+#   dispatcher thread. The events wait in a backlog until a task of the executor
+#   takes them.
+class _CallbackRunner:
+    # @executor the concurrent.futures.Executor object running the callbacks
+    # @ordered true if the events are handled one at a time, in order, false if
+    # each event is handled by its own task
+    # @backlog the max number of events waiting for a task, None for no limit
+    # @overflow what to do with an event once the backlog is full (DROP_OLDEST,
+    # DROP_NEWEST or BLOCK)
+    # @pending the events waiting for a task, with their callbacks
+    # @running the number of tasks submitted and not finished
+    # @dropped the number of events dropped from a full backlog, or because no task
+    # could be submitted to take them
+    # @cond the condition guarding the state above, which a blocked put waits on
+    def __init__(self, executor, ordered, backlog, overflow):
+        self.executor = executor
+        self.ordered = ordered
+        self.backlog = backlog
+        self.overflow = overflow
+        self.pending = collections.deque()
+        self.running = 0
+        self.dropped = 0
+        self.cond = threading.Condition()
+
+    # @brief queue an event to run callbacks for
+    # @param[in] callbacks: the callbacks of the channel
+    # @param[in] edge_event: the tuple passed to the callbacks
+    def put(self, callbacks, edge_event):
+        with self.cond:
+            if self.backlog is not None and len(self.pending) >= self.backlog:
+                if self.overflow == DROP_NEWEST:
+                    self.dropped += 1
+                    return
+                elif self.overflow == DROP_OLDEST:
+                    self.pending.popleft()
+                    self.dropped += 1
+                else:
+                    # only a running task frees room in the backlog
+                    while len(self.pending) >= self.backlog and self.running:
+                        self.cond.wait()
+
+            self.pending.append((callbacks, edge_event))
+
+            # an ordered runner has a single task at a time, which takes the
+            # events in order until none is left
+            if self.ordered and self.running:
+                return
+            self.running += 1
+
+        try:
+            self.executor.submit(self._run)
+        except Exception as e:
+            # e.g. the executor was shut down. The event is dropped rather than
+            # left waiting for a task that never comes
+            with self.cond:
+                self.running -= 1
+                if self.pending:
+                    self.pending.pop()
+                    self.dropped += 1
+                self.cond.notify_all()
+            warnings.warn("Dropping the callbacks of an event: " + str(e), RuntimeWarning)
+
+    def _run(self):
+        while True:
+            with self.cond:
+                if not self.pending:
+                    self.running -= 1
+                    return
+                callbacks, edge_event = self.pending.popleft()
+                self.cond.notify_all()
+
+            _run_callbacks(callbacks, edge_event)
+
+            if not self.ordered:
+                with self.cond:
+                    self.running -= 1
+                return
+
 # @brief adding an edge detecting event
-#   The detection event runs in an thread that enables non-blocking I/O multiplexing approach.
+#   The detection event is served by the dispatcher thread that waits on the event
+#   handles of all the channels at once, which is started with the first event.
 #   However, one pin on a chip (channel) can only allow one edge detection event, the new added
 #   event will be removed if there's an existing event.
-# @param[in] chip_fd: file descriptor
+# @param[in] line_fd: the file descriptor of the line handle reporting the
+# edge events of the channel, which the caller owns
 # @param[in] chip_name: the GPIO chip name/instance
-# @param[in] channel: the file descriptor for the chip line
-# @param[in] request: gpioevent_request struct that describes gpio event monitoring
-# @param[in] bouncetime: the time interval for debouncing
-# @param[in] poll_time: the max time to wait for an edge event
+# @param[in] channel: the pin number in specified mode (board or bcm)
+# @param[in] bouncetime_us: the time interval for debouncing (us)
+# @param[in] queue_size: the max number of events queued for get_edge_events(),
+# None to not queue the events
+# @param[in] executor: the concurrent.futures.Executor object to run the callbacks
+# in, None to run them in the dispatcher thread
+# @param[in] ordered: true to run the callbacks of the events one event at a time,
+# in order, false to run the callbacks of each event in its own task
+# @param[in] backlog: the max number of events waiting for the executor, None
+# for no limit
+# @param[in] overflow: what to do with an event once the backlog is full:
+# DROP_OLDEST, DROP_NEWEST, or BLOCK which makes the dispatcher thread wait
 # @param[out] success on 0, otherwise return 2 if something fatal happened
-def add_edge_detect(chip_fd, chip_name, channel, request, bouncetime, poll_time):
-    gpio_obj = None
-    res = gpio_event_added(chip_name, channel)
+def add_edge_detect(line_fd, chip_name, channel, bouncetime_us, queue_size=None,
+                    executor=None, ordered=True, backlog=None, overflow=DROP_OLDEST):
+    global _epoll_obj, _dispatcher_thread, _dispatcher_ready, _wakeup_fds
 
-    # event not added
-    if not res:
-        # open the line
-        try:
-            ioctl_ret = fcntl.ioctl(chip_fd, cdev.GPIO_GET_LINEEVENT_IOCTL, request)
-        except (OSError, IOError) as e:
-            raise cdev.GPIOError(e.errno, "Opening input line event handle: " + e.strerror)
-    else:
+    gpio_obj = _Gpios(line_fd, bouncetime_us, queue_size)
+    gpio_obj.thread_added = True
+    if executor is not None:
+        gpio_obj.runner = _CallbackRunner(executor, ordered, backlog, overflow)
+
+    if not _add_gpio_event(chip_name, channel, gpio_obj):
         warnings.warn("Warning: event is already added, ignore new added event", RuntimeWarning)
         return 1
 
-    # Check if we successfully get the event handle from ioctl
-    if ioctl_ret < 0:
-        raise cdev.GPIOError("Unable to get line event handle", e.strerror)
-    else:
-        gpio_obj = _Gpios(request.fd, bouncetime)
-
-    # create epoll object for fd if not already open
-    _mutex.acquire()
-    if channel not in _epoll_fd_thread:
-        _epoll_fd_thread[channel] = select.epoll()
-        if _epoll_fd_thread[channel] is None:
-            _mutex.release()
-
-            return 2
-
-    # add eventmask and fd to epoll object
-    try:
-        # eventmask: available for read and edge trigger
-        _epoll_fd_thread[channel].register(gpio_obj.value_fd, select.EPOLLIN | select.EPOLLET)
-    except IOError:
-        _mutex.release()
-        remove_edge_detect(chip_name, channel)
-
-        return 2
-    _mutex.release()
-
-    # create and start poll thread if not already running
+    _registry_lock.acquire()
     try:
-        thread_id = thread.start_new_thread(_edge_handler, ("edge_handler_thread", request.fd, channel, poll_time))
-        gpio_obj.thread_id = thread_id
+        # clean device buffer
+        cdev.drain_events(line_fd)
+
+        # create the epoll object shared by all the channels if not already open,
+        # with the pipe waking the dispatcher thread up
+        if _epoll_obj is None:
+            _epoll_obj = select.epoll()
+            _wakeup_fds = os.pipe2(os.O_NONBLOCK | os.O_CLOEXEC)
+            _epoll_obj.register(_wakeup_fds[0], select.EPOLLIN)
+
+        # eventmask: available for read and edge trigger. An edge that
+        # happened since the drain is reported by the first poll
+        _epoll_obj.register(line_fd, select.EPOLLIN | select.EPOLLET)
+        _epoll_gpio_objs[line_fd] = gpio_obj
+
+        # start the dispatcher thread if not already running
+        if _dispatcher_thread is None:
+            _dispatcher_ready = threading.Event()
+            _dispatcher_thread = threading.Thread(target=_edge_handler, name="edge_handler_thread",
+                                                  args=(_epoll_obj, _wakeup_fds[0], _dispatcher_ready))
+            _dispatcher_thread.daemon = True
+            _dispatcher_thread.start()
+        ready = _dispatcher_ready
     except:
+        _registry_lock.release()
         remove_edge_detect(chip_name, channel)
-        warnings.warn("Unable to start thread", RuntimeWarning)
+        warnings.warn("Unable to start edge detection", RuntimeWarning)
 
         return 2
+    _registry_lock.release()
 
-    gpio_obj.thread_added = True
-    _add_gpio_event(chip_name, channel, gpio_obj)
+    # A running dispatcher polls the new event handle at once, a new one is
+    # waited for until it polls
+    if not ready.wait(_DISPATCHER_START_TIMEOUT):
+        warnings.warn("Timeout in waiting for event detection to start", RuntimeWarning)
 
     return 0
 
-# @brief Remove an edge event detection
-#   Not only will the event be unregistered, the thread corresponds will also be cleared.
-# Suggestion about the timeout parameter: the value should be greater than the poll_time
-# in add_edge_detect to keep it safe. This event returns without doing anything if the
-# event corresponding to the chip_name and channel is not found.
+# @brief adding an edge event whose handle the caller waits on and reads itself
+#   The event is not served by the dispatcher thread, it only marks the channel as
+#   detecting edges until remove_edge_detect() is called.
+# @param[in] line_fd: the file descriptor of the line handle reporting the
+# edge events of the channel, which the caller owns
 # @param[in] chip_name: the GPIO chip name/instance
 # @param[in] channel: the pin number in specified mode (board or bcm)
-# @param[in] timeout: the maximum time to wait for the thread detecting channel to stop
-def remove_edge_detect(chip_name, channel, timeout=0.3):
+# @param[in] bouncetime_us: the time interval for debouncing (us)
+# @param[in] persistent: true to keep the event between the waits, queueing the
+# events read but not yet waited for
+# @param[out] True on success, False if an event is already added to the channel
+def add_edge_wait(line_fd, chip_name, channel, bouncetime_us, persistent=False):
+    gpio_obj = _Gpios(line_fd, bouncetime_us)
+    if persistent:
+        gpio_obj.persistent = True
+        gpio_obj.queue = collections.deque()
+
+    return _add_gpio_event(chip_name, channel, gpio_obj)
+
+# @brief Check if a persistent edge wait is armed on the channel
+# @param[in] chip_name: the GPIO chip name/instance
+# @param[in] channel: the pin number in specified mode (board or bcm)
+# @param[out] True if a persistent wait is armed, False otherwise
+def edge_wait_armed(chip_name, channel):
     gpio_obj = gpio_event_added(chip_name, channel)
+    return gpio_obj is not None and gpio_obj.persistent
 
-    if gpio_obj is None:
-        return
-
-    # Have the thread to be in an exit state
-    _mutex.acquire()
-    thread_id = _gpio_event_list[chip_name][channel].thread_id
-    _thread_running_dict[thread_id] = False
-
-    # Wait till the thread exits
-    if _gpio_event_list[chip_name][channel].thread_added == True:
-        _mutex.release()
-        time.sleep(timeout)
-        _mutex.acquire()
-
-        if _gpio_event_list[chip_name][channel].thread_exited == False:
-            warnings.warn("Timeout in waiting event detection to be removed", RuntimeWarning)
+# @brief Remove an edge event detection
+#   The event handle is unregistered from the dispatcher thread, which is woken up
+#   and joined once no event is left to detect. The dispatcher only reads an event
+#   handle while it is registered and not removed, which is checked while holding
+#   the lock of the event, so the event is removed as soon as this returns. This
+#   event returns without doing anything if the event corresponding to the chip_name
+#   and channel is not found. The line handle of the event is left open for its
+#   owner to close.
+# @param[in] chip_name: the GPIO chip name/instance
+# @param[in] channel: the pin number in specified mode (board or bcm)
+# @param[in] timeout: the max time to wait for the dispatcher thread to exit (second)
+def remove_edge_detect(chip_name, channel, timeout=0.3):
+    _remove_edge_detects([(chip_name, channel)], timeout)
+
+# @brief Remove edge event detections at once
+#   The events are removed from the registry in one go, so the dispatcher thread
+#   is woken up and joined at most once, however many events are removed.
+# @param[in] events: a list of tuples of the chip name and channel of the events,
+# the ones not found are skipped
+# @param[in] timeout: the max time to wait for the dispatcher thread to exit (second)
+def _remove_edge_detects(events, timeout):
+    dispatcher = None
+    gpio_objs = []
+
+    _registry_lock.acquire()
+    for chip_name, channel in events:
+        gpio_obj = _gpio_event_list.get(chip_name, {}).pop(channel, None)
+        if gpio_obj is None:
+            continue
+        gpio_objs.append(gpio_obj)
+
+        # unregister the epoll file descriptor, blocking waits never register one
+        if _epoll_gpio_objs.pop(gpio_obj.value_fd, None) is not None:
+            _epoll_obj.unregister(gpio_obj.value_fd)
+            if not _epoll_gpio_objs:
+                dispatcher = _wake_dispatcher()
+    _registry_lock.release()
+
+    # wait for a read of the event handles in progress to finish
+    for gpio_obj in gpio_objs:
+        with gpio_obj.lock:
+            gpio_obj.removed = True
+
+    # a callback removing the last event does not wait for its own thread
+    if dispatcher is not None and dispatcher is not threading.current_thread():
+        dispatcher.join(timeout)
+
+# @brief Wake the dispatcher thread up to check whether it is still needed.
+#   Called while holding _registry_lock
+# @param[out] the threading.Thread object of the dispatcher, None if not running
+def _wake_dispatcher():
+    if _dispatcher_thread is None:
+        return None
 
-    # unregister the epoll file descriptor
-    if channel in _epoll_fd_thread and _epoll_fd_thread[channel] is not None:
-        _epoll_fd_thread[channel].unregister(_gpio_event_list[chip_name][channel].value_fd)
+    try:
+        os.write(_wakeup_fds[1], b'\0')
+    except BlockingIOError:
+        # the pipe is full, the dispatcher is already woken up
+        pass
 
-    del _gpio_event_list[chip_name][channel]
-    _mutex.release()
+    return _dispatcher_thread
 
 # @brief Add a callback function for an event
 #   Note that if the function does not exist or the event has not been set up, warning
 #   will be shown, ignoring the action
 # @param[in] chip_name: the GPIO chip name/instance
 # @param[in] channel: the pin number in specified mode (board or bcm)
-# @param[in] callback: a callback function
+# @param[in] callback: a callback function, called with a tuple of the event id
+# (GPIOEVENT_EVENT_*), the kernel timestamp (ns) and the sequence number of the event
 def add_edge_callback(chip_name, channel, callback):
     gpio_obj = gpio_event_added(chip_name, channel)
 
@@ -216,14 +388,12 @@ def add_edge_callback(chip_name, channel, callback):
         warnings.warn("Event not found", RuntimeWarning)
         return
 
-    _mutex.acquire()
-    if not _gpio_event_list[chip_name][channel].thread_added:
-        _mutex.release()
+    if not gpio_obj.thread_added:
         warnings.warn("Please add the event before adding callback", RuntimeWarning)
         return
 
-    _gpio_event_list[chip_name][channel].callbacks.append(callback)
-    _mutex.release()
+    with gpio_obj.lock:
+        gpio_obj.callbacks.append(callback)
 
 # @brief Check if any edge event occured
 #   If an adge event happened, the flag will be cleared for the next occurance
@@ -237,281 +407,409 @@ def edge_event_detected(chip_name, channel):
         warnings.warn("Event not found", RuntimeWarning)
         return False
 
-    _mutex.acquire()
-    # Event has occured
-    if _gpio_event_list[chip_name][channel].event_occurred:
-        _gpio_event_list[chip_name][channel].event_occurred = False
-        _mutex.release()
-
-        return True
-    _mutex.release()
+    with gpio_obj.lock:
+        # Event has occured
+        if gpio_obj.event_occurred:
+            gpio_obj.event_occurred = False
+            return True
 
     return False
 
-# @brief Check if any event is added to the channel in the chip controller
+# @brief Take the queued events of a channel, oldest first
 # @param[in] chip_name: the GPIO chip name/instance
 # @param[in] channel: the pin number in specified mode (board or bcm)
-# @param[out] the gpio object if an event exists, otherwise None
-def gpio_event_added(chip_name, channel):
-    _mutex.acquire()
-    if chip_name not in _gpio_event_list:
-        _mutex.release()
-        return None
-    if channel not in _gpio_event_list[chip_name]:
-        _mutex.release()
+# @param[in] max_n: the max number of events to take, None for all of them
+# @param[out] a list of tuples of the event id, timestamp (ns) and sequence number,
+# None if the event is not found or does not queue events
+def get_edge_events(chip_name, channel, max_n=None):
+    gpio_obj = gpio_event_added(chip_name, channel)
+    if gpio_obj is None or gpio_obj.queue is None:
         return None
 
-    gpio_obj = _gpio_event_list[chip_name][channel]
-    _mutex.release()
-
-    return gpio_obj
+    with gpio_obj.lock:
+        queue = gpio_obj.queue
+        count = len(queue) if max_n is None else min(max_n, len(queue))
+        return [queue.popleft() for _ in range(count)]
 
-# @brief Add an event to the event list
+# @brief Count the events dropped from the queue of a channel
 # @param[in] chip_name: the GPIO chip name/instance
 # @param[in] channel: the pin number in specified mode (board or bcm)
-# @param[in] gpio_obj: the gpio handle with related information of a channel's
-# event
-def _add_gpio_event(chip_name, channel, gpio_obj):
-    _mutex.acquire()
-    if chip_name not in _gpio_event_list:
-        _gpio_event_list[chip_name] = {}
+# @param[out] the number of events dropped because the queue was full, None if the
+# event is not found or does not queue events
+def edge_events_dropped(chip_name, channel):
+    gpio_obj = gpio_event_added(chip_name, channel)
+    if gpio_obj is None or gpio_obj.queue is None:
+        return None
 
-    if channel not in _gpio_event_list[chip_name]:
-        _gpio_event_list[chip_name][channel] = gpio_obj
-    _mutex.release()
+    with gpio_obj.lock:
+        return gpio_obj.dropped
 
-# @brief Look up by chip name and channel to get the gpio object
-#   with related information of a channel's event
+# @brief Count the events whose callbacks were dropped from a full backlog, or
+#   because they could not be submitted to the executor
 # @param[in] chip_name: the GPIO chip name/instance
 # @param[in] channel: the pin number in specified mode (board or bcm)
-# @param[out] the gpio handle with related information of a channel's event,
-# if such handle exist, otherwise return None
-def _get_gpio_object(chip_name, channel):
+# @param[out] the number of events dropped, None if the event is not found or
+# does not run its callbacks in an executor
+def edge_callbacks_dropped(chip_name, channel):
     gpio_obj = gpio_event_added(chip_name, channel)
+    runner = gpio_obj.runner if gpio_obj is not None else None
 
-    if gpio_obj is None:
-        warnings.warn("Event not found", RuntimeWarning)
+    if runner is None:
         return None
 
-    _mutex.acquire()
-    gpio_obj = _gpio_event_list[chip_name][channel]
-    _mutex.release()
-
-    return gpio_obj
+    with runner.cond:
+        return runner.dropped
 
+# @brief Check if any event is added to the channel in the chip controller
+#   The registry is only written while holding its lock, a lookup is a single
+#   dictionary read that does not take it
+# @param[in] chip_name: the GPIO chip name/instance
+# @param[in] channel: the pin number in specified mode (board or bcm)
+# @param[out] the gpio object if an event exists, otherwise None
+def gpio_event_added(chip_name, channel):
+    return _gpio_event_list.get(chip_name, {}).get(channel, None)
 
-def _set_edge(gpio_name, edge):
-    raise RuntimeError("This function is deprecated")
+# @brief Add an event to the event list
+# @param[in] chip_name: the GPIO chip name/instance
+# @param[in] channel: the pin number in specified mode (board or bcm)
+# @param[in] gpio_obj: the gpio handle with related information of a channel's
+# event
+# @param[out] True if added, False if an event is already added to the channel
+def _add_gpio_event(chip_name, channel, gpio_obj):
+    with _registry_lock:
+        chip_events = _gpio_event_list.setdefault(chip_name, {})
+        if channel in chip_events:
+            return False
 
-# @brief Look up by chip name and channel to get the gpio object
-#   with related information of a channel's event
-# @param[in] fd: the file descriptor of a channel/line
-# @param[out] a tuple of the GPIO chip name and the pin number in
-# specified mode, otherwise return a tuple of None
-def _get_gpio_obj_keys(fd):
-    _mutex.acquire()
-    for chip_name in _gpio_event_list:
-        for pin in _gpio_event_list[chip_name]:
-            if _gpio_event_list[chip_name][pin].value_fd == fd:
-                _mutex.release()
+        chip_events[channel] = gpio_obj
 
-                return (chip_name, pin)
+    return True
 
-    _mutex.release()
-    return None, None
+def _set_edge(gpio_name, edge):
+    raise RuntimeError("This function is deprecated")
 
 def _get_gpio_file_object(fileno):
     raise RuntimeError("This function is deprecated")
 
 
-def _set_thread_exit_state(fd):
-    chip_name, channel = _get_gpio_obj_keys(fd)
-
-    # Get the gpio object to do following updates
-    gpio_obj = _get_gpio_object(chip_name, channel)
-    if gpio_obj == None:
-        warnings.warn("Channel has been remove from detection before thread exits", RuntimeWarning)
-        return
-
-    # Set state
-    _mutex.acquire()
-    _gpio_event_list[chip_name][channel].thread_exited = True
-    _mutex.release()
-
-
-# @brief A thread that catches GPIO events in a non-blocking mode.
-#   Exit upon error (may be fd non-existance, information descrepency,
-#   unknown error)
-# @param[in] thread_name: a functional name of the thread
+# @brief Handle an edge event reported by the dispatcher's epoll object.
+#   The event handle is routed to its gpio object through _epoll_gpio_objs and
+#   read while holding the lock of the gpio object, so that it is not read once
+#   its event is removed, and the callbacks run after releasing it. The handle is
+#   non-blocking, a stale readiness, e.g. of a file descriptor reused by a new
+#   event, reads no event instead of blocking the dispatcher.
 # @param[in] fd: the file descriptor of a channel/line
-# @param[in] channel: the pin number in specified mode (board or bcm)
-# @param[in] poll_timeout: the maximum time set to wait for edge event (second)
-def _edge_handler(thread_name, fileno, channel, poll_timeout):
-    thread_id = thread.get_ident()
-
-    # Mark the thread state as running
-    _mutex.acquire()
-    _thread_running_dict[thread_id] = True
-
-    # clean device buffer
-    epoll_obj = _epoll_fd_thread[channel]
-    _mutex.release()
+# @param[in] buf: the event buffer of the dispatcher thread
+def _handle_edge(fd, buf):
+    gpio_obj = _epoll_gpio_objs.get(fd, None)
+    if gpio_obj is None:
+        return
 
-     # The timeout should be longer than the wait time between the events
-    precedent_events = epoll_obj.poll(timeout=0.5, maxevents=1)
-    if len(precedent_events) > 0:
-        _fd = precedent_events[0][0]
+    with gpio_obj.lock:
+        # the event may have been removed since the poll returned
+        if gpio_obj.removed:
+            return
 
+        #read all the pending events out. The event handle is edge
+        # triggered, the events left behind would only be seen on the next edge
         try:
-            data = os.read(_fd, ctypes.sizeof(cdev.gpioevent_data))
-        except OSError as e:
-            raise cdev.GPIOError(e.errno, "Reading GPIO event: " + e.strerror)
+            events = cdev.read_events(fd, buf)
+        except cdev.GPIOError as e:
+            warnings.warn(str(e), RuntimeWarning)
+            return
+
+        fired = []
+        now_ns = time.monotonic_ns()
+        first = True
+        for timestamp_ns, event_id, line_seqno in events:
+            # the v1 uAPI has no sequence numbers, the events are counted here
+            gpio_obj.seqno = line_seqno if line_seqno is not None else gpio_obj.seqno + 1
 
-    while _thread_running_dict[thread_id]:
-        try:
-            # poll for event
-            events = epoll_obj.poll(timeout=poll_timeout, maxevents=1)
-
-            # Timeout without any event
-            if len(events) == 0:
-                # The timeout is especially added to confirm the thread running status, so
-                # it is a design that no warning signal is shown when timeout
+            # event result
+            if (event_id != cdev.GPIOEVENT_EVENT_RISING_EDGE and
+                event_id != cdev.GPIOEVENT_EVENT_FALLING_EDGE):
+                warnings.warn("Unknown event caught", RuntimeWarning)
                 continue
-            fd = events[0][0]
 
-            # Check if the returning fd is the one we are waiting for
-            if fd != fileno:
-                raise RuntimeError("File object not found after wait for GPIO %s" % channel)
+            kept = _debounce(gpio_obj, timestamp_ns, now_ns, first)
+            first = False
+            if not kept:
+                continue
 
-            #read the result out
-            try:
-                data = os.read(fd, ctypes.sizeof(cdev.gpioevent_data))
-            except OSError as e:
-                raise cdev.GPIOError(e.errno, "Reading GPIO event: " + e.strerror)
+            gpio_obj.event_occurred = True
+            edge_event = (event_id, timestamp_ns, gpio_obj.seqno)
+            fired.append(edge_event)
 
-            event_data = cdev.gpioevent_data.from_buffer_copy(data)
+            # a full queue drops its oldest event
+            if gpio_obj.queue is not None:
+                if len(gpio_obj.queue) == gpio_obj.queue.maxlen:
+                    gpio_obj.dropped += 1
+                gpio_obj.queue.append(edge_event)
+        callbacks = list(gpio_obj.callbacks)
+        runner = gpio_obj.runner
 
-            # event result
-            if (event_data.id != cdev.GPIOEVENT_REQUEST_RISING_EDGE and
-                event_data.id != cdev.GPIOEVENT_REQUEST_FALLING_EDGE):
-                warnings.warn("Unknown event caught", RuntimeWarning)
-                continue
-
-            # check key to make sure gpio object has not been deleted
-            # from main thread
-            chip_name, pin_num = _get_gpio_obj_keys(fd)
-            if channel != pin_num:
-                warnings.warn("Channel does not match with assigned file descriptor", RuntimeWarning)
+    if not callbacks:
+        return
 
-                _mutex.acquire()
-                _thread_running_dict[thread.get_ident()] = False
-                _mutex.release()
+    # callback function, once per event
+    for edge_event in fired:
+        if runner is not None:
+            runner.put(callbacks, edge_event)
+        else:
+            _run_callbacks(callbacks, edge_event)
+
+
+# @brief Debounce an event for the bouncetime of its gpio object, by its kernel
+#   timestamp. The kernel debounces the events where it supports the v2 uAPI, the
+#   v1 uAPI of kernels before 5.7 stamps the events with the wall clock, which may
+#   be stepped back. An event stamped before the last event kept is then debounced
+#   by the monotonic time it is read at if it is the first event of its read, and
+#   kept otherwise, as all the events of a read are read at the same time
+# @param[in] gpio_obj: the gpio object of the event
+# @param[in] timestamp_ns: the kernel timestamp (ns) of the event
+# @param[in] now_ns: the time.monotonic_ns() time the event is read at
+# @param[in] first: true for the first event of a read
+# @param[out] True if the event is kept, False if it is a bounce
+def _debounce(gpio_obj, timestamp_ns, now_ns, first):
+    if gpio_obj.bouncetime_us is not None and gpio_obj.lastcall is not None:
+        elapsed_ns = timestamp_ns - gpio_obj.lasttimestamp
+        if elapsed_ns < 0 and first:
+            elapsed_ns = now_ns - gpio_obj.lastcall
+        if 0 <= elapsed_ns <= gpio_obj.bouncetime_us * 1000:
+            return False
+
+    gpio_obj.lastcall = now_ns
+    gpio_obj.lasttimestamp = timestamp_ns
+    return True
+
+
+# @brief Run the callbacks of an event. The dispatcher serves every channel, so a
+#   failing callback is reported without stopping the detection
+# @param[in] callbacks: the callback functions
+# @param[in] edge_event: the tuple of the event id, timestamp (ns) and sequence number
+def _run_callbacks(callbacks, edge_event):
+    for cb_func in callbacks:
+        try:
+            cb_func(edge_event)
+        except Exception:
+            traceback.print_exc()
+
+
+# @brief The dispatcher thread that catches the GPIO events of all the channels
+#   in a non-blocking mode. It waits for the events without a timeout, and exits
+#   once it is woken up with no event left to detect.
+# @param[in] epoll_obj: the epoll object holding the event handles
+# @param[in] wakeup_fd: the read file descriptor of the pipe waking the thread up
+# @param[in] ready: the threading.Event to set once the thread polls
+def _edge_handler(epoll_obj, wakeup_fd, ready):
+    global _epoll_obj, _dispatcher_thread, _wakeup_fds
+
+    # events are read in bulk into the same buffer on every wakeup
+    buf = cdev.event_buffer()
+
+    # The event handles are drained when they are added, so the thread is
+    # ready as soon as it polls
+    ready.set()
+
+    while True:
+        with _registry_lock:
+            if not _epoll_gpio_objs:
+                # no event is left to detect. Checked while holding the registry
+                # lock, so a new event is either seen here or starts a new dispatcher
+                _epoll_obj.close()
+                _epoll_obj = None
+                for fd in _wakeup_fds:
+                    os.close(fd)
+                _wakeup_fds = None
+                _dispatcher_thread = None
                 break
 
-            # Get the gpio object to do following updates
-            gpio_obj = _get_gpio_object(chip_name, pin_num)
-            if gpio_obj is None:
-                raise RuntimeError("GPIO object does not exists")
-
-            # debounce the input event for the specified bouncetime
-            time = datetime.now()
-            time = time.second * 1E6 + time.microsecond
-            if (gpio_obj.bouncetime is None or
-                    (time - gpio_obj.lastcall >
-                        gpio_obj.bouncetime * 1000) or
-                    (gpio_obj.lastcall == 0) or gpio_obj.lastcall > time):
-                gpio_obj.lastcall = time
-                gpio_obj.event_occurred = True
-
-                #update to the original list
-                _mutex.acquire()
-                _gpio_event_list[chip_name][pin_num] = gpio_obj
-                _mutex.release()
-
-                # callback function
-                for cb_func in gpio_obj.callbacks:
-                    cb_func()
-
+        try:
+            # poll for event
+            events = epoll_obj.poll()
         # if interrupted by a signal, continue to start of the loop
         except InterruptedError:
             continue
-        except AttributeError:
-            break
-        finally:
-            if _mutex.locked():
-                _mutex.release()
 
-    _set_thread_exit_state(fileno)
-    thread.exit()
+        for fd, _ in events:
+            if fd == wakeup_fd:
+                # check whether any event is left to detect
+                while True:
+                    try:
+                        os.read(wakeup_fd, 64)
+                    except BlockingIOError:
+                        break
+                continue
+            _handle_edge(fd, buf)
 
 # This function waits for a edge event in a blocking mode, which the user must
-# specify the file descriptor of the chip, which channel of the chip, the event handle,
-# time for debouncing in milliseconds, the time limit to wait for the event.
+# specify the file descriptor of the line handle reporting the edge events, which
+# channel of the chip, time for debouncing in microseconds, the time limit to wait
+# for the event in seconds, which can be a float. The time limit is a monotonic
+# deadline, which holds when the wait is interrupted by a signal. A persistent wait keeps the event once it returns, and the next
+# persistent wait of the channel takes the events that happened since, oldest first.
 # return value: -2 for fatal errors, -1 if edge is already being detected, 0 if timeout
 # occured, and 1 if event was valid
-def blocking_wait_for_edge(chip_fd, chip_name, channel, request, bouncetime, timeout):
-    # check if gpio edge already added. Add if not already added
+def blocking_wait_for_edge(line_fd, chip_name, channel, bouncetime_us, timeout, persistent=False):
+    # check if gpio edge already added. Add if not already added. As object is
+    # added to gpio event list here, we need to return it when the function return,
+    # unless it is kept for the next persistent wait
     gpio_obj = gpio_event_added(chip_name, channel)
-    if gpio_obj != None:
-        return -1
-    else:
-        try:
-            fcntl.ioctl(chip_fd, cdev.GPIO_GET_LINEEVENT_IOCTL, request)
-        except (OSError, IOError) as e:
-            raise cdev.GPIOError(e.errno, "Opening input line event handle: " + e.strerror)
-        gpio_obj = _Gpios(request.fd, bouncetime)
-        # As object is added to gpio event list here, we need to return it when
-        # the function return
-        _add_gpio_event(chip_name, channel, gpio_obj)
+    if gpio_obj is None or not gpio_obj.persistent:
+        if not add_edge_wait(line_fd, chip_name, channel, bouncetime_us, persistent):
+            return -1
+        gpio_obj = gpio_event_added(chip_name, channel)
 
-    ret = select.select([request.fd], [], [], timeout)
+    try:
+        result = _wait_edge_event(gpio_obj, timeout)
+    except:
+        remove_edge_detect(chip_name, channel)
+        raise
 
-    if ret[0] == [request.fd]:
-        try:
-            data = os.read(request.fd, ctypes.sizeof(cdev.gpioevent_data))
-        except OSError as e:
-            remove_edge_detect(chip_name, channel)
-            raise cdev.GPIOError(e.errno, "Reading GPIO event: " + e.strerror)
+    # a persistent wait keeps its events across a timeout
+    if result == -2 or not persistent:
+        remove_edge_detect(chip_name, channel)
+    return result
+
+
+# @brief Wait for an edge event on the event handle of a gpio object
+#   The event of a persistent wait is taken from its queue, which is filled by
+#   reading all the pending events, otherwise the first event is read
+# @param[in] gpio_obj: the gpio object of the wait
+# @param[in] timeout: the time limit to wait for the event (second), None for no limit
+# @param[out] -2 for fatal errors, 0 if timeout occured, and 1 if event was valid
+def _wait_edge_event(gpio_obj, timeout):
+    if gpio_obj.queue:
+        gpio_obj.queue.popleft()
+        return 1
 
-        event_data = cdev.gpioevent_data.from_buffer_copy(data)
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while True:
+        wait = None if deadline is None else max(deadline - time.monotonic(), 0)
+        try:
+            ret = select.select([gpio_obj.value_fd], [], [], wait)
+        # if interrupted by a signal, wait again until the deadline
+        except InterruptedError:
+            continue
+        if not ret[0]:
+            # Timeout
+            return 0
+
+        if gpio_obj.persistent:
+            if gpio_obj.buf is None:
+                gpio_obj.buf = cdev.event_buffer()
+            events = cdev.read_events(gpio_obj.value_fd, gpio_obj.buf)
+        else:
+            event = cdev.read_event(gpio_obj.value_fd)
+            events = [event] if event is not None else []
+
+        edge_events = _take_events(gpio_obj, events)
+        if edge_events is None:
+            return -2
 
-        if (event_data.id != cdev.GPIOEVENT_REQUEST_RISING_EDGE and
-            event_data.id != cdev.GPIOEVENT_REQUEST_FALLING_EDGE):
+        if gpio_obj.queue is None:
+            if edge_events:
+                return 1
+        else:
+            gpio_obj.queue.extend(edge_events)
+            if gpio_obj.queue:
+                gpio_obj.queue.popleft()
+                return 1
+
+
+# @brief Take the events read from the event handle of a wait, numbering and
+#   debouncing them
+# @param[in] gpio_obj: the gpio object of the wait
+# @param[in] events: the tuples of the timestamp (ns), event id and line sequence
+# number of the events read
+# @param[out] a list of tuples of the event id, timestamp (ns) and sequence number
+# of the events not debounced, None if an unknown event was caught
+def _take_events(gpio_obj, events):
+    edge_events = []
+    now_ns = time.monotonic_ns()
+    first = True
+    for timestamp_ns, event_id, line_seqno in events:
+        # the v1 uAPI has no sequence numbers, the events are counted here
+        gpio_obj.seqno = line_seqno if line_seqno is not None else gpio_obj.seqno + 1
+
+        if (event_id != cdev.GPIOEVENT_EVENT_RISING_EDGE and
+            event_id != cdev.GPIOEVENT_EVENT_FALLING_EDGE):
             warnings.warn("Unknown event caught", RuntimeWarning)
+            return None
+
+        if _debounce(gpio_obj, timestamp_ns, now_ns, first):
+            edge_events.append((event_id, timestamp_ns, gpio_obj.seqno))
+        first = False
+
+    return edge_events
+
+
+# This function waits for the edge events of several channels in a blocking mode,
+# on a single epoll object watching their line handles. The user must specify the
+# file descriptor of the line handle, the chip and the channel of each of them, the
+# time for debouncing in microseconds and the time limit to wait for the events.
+# return value: -2 for fatal errors, -1 if edge is already being detected on one of
+# the channels, an empty list if timeout occured, otherwise a list of tuples of the
+# channel, event id, timestamp (ns) and sequence number of the events read at once,
+# oldest first
+def blocking_wait_for_any_edge(waits, bouncetime_us, timeout):
+    gpio_objs = {}
+    epoll_obj = None
+    try:
+        for line_fd, chip_name, channel in waits:
+            if not add_edge_wait(line_fd, chip_name, channel, bouncetime_us):
+                return -1
+            gpio_objs[line_fd] = (chip_name, channel, gpio_event_added(chip_name, channel))
+
+        epoll_obj = select.epoll()
+        for line_fd in gpio_objs:
+            epoll_obj.register(line_fd, select.EPOLLIN)
+
+        buf = cdev.event_buffer()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = -1 if deadline is None else max(deadline - time.monotonic(), 0)
+            try:
+                ready = epoll_obj.poll(wait)
+            # if interrupted by a signal, wait again until the deadline
+            except InterruptedError:
+                continue
+            if not ready:
+                # Timeout
+                return []
+
+            fired = []
+            for fd, _ in ready:
+                _, channel, gpio_obj = gpio_objs[fd]
+                edge_events = _take_events(gpio_obj, cdev.read_events(fd, buf))
+                if edge_events is None:
+                    return -2
+                fired.extend((channel,) + edge_event for edge_event in edge_events)
+
+            # the events of all the channels are reported in the order they happened
+            if fired:
+                fired.sort(key=lambda edge_event: edge_event[2])
+                return fired
+    finally:
+        if epoll_obj is not None:
+            epoll_obj.close()
+        for chip_name, channel, _ in gpio_objs.values():
             remove_edge_detect(chip_name, channel)
-            return -2
-        remove_edge_detect(chip_name, channel)
-        return int(ret != [])
-    elif len(ret[0]) == 0:
-        # Timeout
-        remove_edge_detect(chip_name, channel)
-        return 0
-    remove_edge_detect(chip_name, channel)
-    return -2
 
 
 # @brief clean up the event registered on the name of chip and channel
-#   Note that the event detection thread will also be removed
+#   Note that the dispatcher thread exits once no event is left to detect
 # @param[in] chip_name: the GPIO chip name/instance
 # @param[in] channel: the pin number in specified mode (board or bcm)
 def event_cleanup(chip_name, channel):
-    global _epoll_fd_blocking
-
     #remove all the event being detected in the event list
     remove_edge_detect(chip_name, channel)
 
-    #unregister the device being polled
-    _mutex.acquire()
-    for gpio_chip in _gpio_event_list.copy():
-        # Warning: this is only for single threaded solution
-        if channel not in _gpio_event_list[gpio_chip]:
-            # It is a design decision that every pin owns its epoll object
-            if _epoll_fd_blocking is not None:
-                _epoll_fd_blocking.close()
-                _epoll_fd_blocking = None
-
-            if channel in _epoll_fd_thread and _epoll_fd_thread[channel] is not None:
-                _epoll_fd_thread[channel].close()
-                del _epoll_fd_thread[channel]
-
-    _mutex.release()
+# @brief clean up all the events registered
+#   The events are removed at once, so the time taken does not depend on the number
+#   of events. The line handles of the events are left open for their owners to close.
+# @param[in] timeout: the max time to wait for the dispatcher thread to exit (second)
+def event_cleanup_all(timeout=0.3):
+    events = [(chip_name, channel) for chip_name, chip_events in list(_gpio_event_list.items())
+              for channel in list(chip_events)]
+    _remove_edge_detects(events, timeout)
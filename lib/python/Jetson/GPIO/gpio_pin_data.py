@@ -525,7 +525,8 @@ jetson_gpio_data = {
 class ChannelInfo(object):
     # @channel the pin number in specified mode (board or bcm)
     # @chip_fd the file descriptor of the chip 
-    # @line_handle the file descriptor of the line
+    # @line_group the LineGroup object of the line handle holding the line
+    # @line_index the index of the line in its line handle
     # @line_offset Linux GPIO pin number (line offset inside chip, not global)
     # @direction the direction of a pin is configured (in or out)
     # @edge rising and/or falling edge being monitored
@@ -536,7 +537,8 @@ class ChannelInfo(object):
     def __init__(self, channel, line_offset, gpio_name, gpio_chip, pwm_chip_dir, pwm_id, reg_addr = None):
         self.channel = channel
         self.chip_fd = None
-        self.line_handle = None
+        self.line_group = None
+        self.line_index = None
         self.line_offset = line_offset
         self.direction = None
         self.edge = None
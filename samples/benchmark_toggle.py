@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2025, NVIDIA CORPORATION. All rights reserved.
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.  IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+# Measures how many times per second an output pin can be toggled:
+#   allocating: one fresh gpiohandle_data per request, as set_value() used
+#               to do
+#   preallocated: gpio_cdev.set_value(), which reuses the buffer of the line
+#                 handle
+#   GPIO.output(): the complete public API path
+#   handle.set(): a handle from GPIO.get_handle(), which skips validation
+# Nothing needs to be connected to the output pin.
+
+import fcntl
+import sys
+import time
+
+import Jetson.GPIO as GPIO
+from Jetson.GPIO import gpio
+from Jetson.GPIO import gpio_cdev
+
+# Pin Definitions
+output_pin = 12  # BOARD pin 12, BCM pin 18
+
+toggles = 100000
+
+
+# set_value() as it was before line handles kept a buffer of their own
+def allocating_set_value(line_handle, index, value):
+    if gpio_cdev.uapi_v2():
+        data = gpio_cdev.gpio_v2_line_values()
+        data.bits = value << index
+        data.mask = 1 << index
+        request = gpio_cdev.GPIO_V2_LINE_SET_VALUES_IOCTL
+    else:
+        data = gpio_cdev.gpiohandle_data()
+        data.values[index] = value
+        request = gpio_cdev.GPIOHANDLE_SET_LINE_VALUES_IOCTL
+
+    try:
+        fcntl.ioctl(line_handle, request, data)
+    except (OSError, IOError) as e:
+        raise gpio_cdev.GPIOError(e.errno, "Setting line value: " + e.strerror)
+
+
+def report(name, start):
+    elapsed = time.perf_counter() - start
+    print("{:<14} {:>10.0f} toggles/sec".format(name, toggles / elapsed))
+
+
+def main():
+    pin = int(sys.argv[1]) if len(sys.argv) > 1 else output_pin
+
+    GPIO.setmode(GPIO.BOARD)
+    GPIO.setup(pin, GPIO.OUT, initial=GPIO.LOW)
+    ch_info = gpio._channel_data[pin]
+    line_group = ch_info.line_group
+    index = ch_info.line_index
+
+    try:
+        start = time.perf_counter()
+        for i in range(toggles):
+            allocating_set_value(line_group.fd, index, i & 1)
+        report("allocating", start)
+
+        start = time.perf_counter()
+        for i in range(toggles):
+            gpio_cdev.set_value(line_group, index, i & 1)
+        report("preallocated", start)
+
+        start = time.perf_counter()
+        for i in range(toggles):
+            GPIO.output(pin, i & 1)
+        report("GPIO.output()", start)
+
+        handle = GPIO.get_handle(pin)
+        start = time.perf_counter()
+        for i in range(toggles):
+            handle.set(i & 1)
+        report("handle.set()", start)
+    finally:
+        GPIO.cleanup()
+
+
+if __name__ == '__main__':
+    main()
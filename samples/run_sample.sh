@@ -36,6 +36,7 @@ sample_application: simple_input.py
                     button_interrupt.py
                     test_all_apis.py
                     test_all_pins.py
+                    benchmark_toggle.py
 EOF
     exit 1
 }
@@ -20,6 +20,8 @@
 # DEALINGS IN THE SOFTWARE.
 
 from __future__ import print_function
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 import mmap
 import os
 import sys
@@ -28,6 +30,7 @@ import time
 import warnings
 
 import RPi.GPIO as GPIO
+from Jetson.GPIO import gpio_cdev
 
 # If a board has PWM support, the PWM tests expect 'out_a' to be PWM-capable.
 pin_datas = {
@@ -392,6 +395,24 @@ def test_cleanup_all():
     assert GPIO.getmode() is None
 
 
+@test
+def test_cleanup_all_events():
+    GPIO.setmode(GPIO.BOARD)
+    GPIO.setup((pin_data['in_a'], pin_data['in_b']), GPIO.IN)
+    GPIO.add_event_detect(pin_data['in_a'], GPIO.BOTH)
+    GPIO.add_event_detect(pin_data['in_b'], GPIO.BOTH)
+    # The event detections are removed at once
+    start = time.time()
+    GPIO.cleanup()
+    assert time.time() - start < 0.3
+    assert GPIO.getmode() is None
+
+    GPIO.setmode(GPIO.BOARD)
+    GPIO.setup(pin_data['in_a'], GPIO.IN)
+    GPIO.add_event_detect(pin_data['in_a'], GPIO.BOTH)
+    GPIO.cleanup()
+
+
 # Tests of:
 # def input(channel):
 
@@ -404,6 +425,16 @@ def test_input():
     GPIO.cleanup()
 
 
+@test
+def test_input_many():
+    GPIO.setmode(GPIO.BOARD)
+    GPIO.setup((pin_data['in_a'], pin_data['in_b']), GPIO.IN)
+    vals = GPIO.input((pin_data['in_a'], pin_data['in_b']))
+    assert len(vals) == 2
+    assert all(val in (GPIO.LOW, GPIO.HIGH) for val in vals)
+    GPIO.cleanup()
+
+
 # Tests of:
 # def output(channels, values):
 
@@ -470,6 +501,46 @@ def test_out_in_init_low():
     GPIO.cleanup()
 
 
+@test
+def test_out_in_cleanup_shared():
+    GPIO.setmode(GPIO.BOARD)
+    GPIO.setup((pin_data['out_a'], pin_data['out_b']), GPIO.OUT,
+               initial=GPIO.HIGH)
+    GPIO.setup(pin_data['in_a'], GPIO.IN)
+    # Cleaning up one channel must not disturb the lines set up along with it
+    GPIO.cleanup(pin_data['out_b'])
+    val = GPIO.input(pin_data['in_a'])
+    assert(val == GPIO.HIGH)
+    GPIO.output(pin_data['out_a'], GPIO.LOW)
+    val = GPIO.input(pin_data['in_a'])
+    assert(val == GPIO.LOW)
+    GPIO.cleanup()
+
+
+# Tests of:
+# def get_handle(channel):
+
+
+@test
+def test_handle_out_in():
+    GPIO.setmode(GPIO.BOARD)
+    GPIO.setup(pin_data['out_a'], GPIO.OUT, initial=GPIO.LOW)
+    GPIO.setup(pin_data['in_a'], GPIO.IN)
+    out_handle = GPIO.get_handle(pin_data['out_a'])
+    in_handle = GPIO.get_handle(pin_data['in_a'])
+    out_handle.set(GPIO.HIGH)
+    assert in_handle.get() == GPIO.HIGH
+    assert out_handle.toggle() == GPIO.LOW
+    assert in_handle.get() == GPIO.LOW
+    GPIO.cleanup()
+    try:
+        out_handle.set(GPIO.HIGH)
+    except RuntimeError:
+        pass
+    else:
+        raise Exception("Handle still usable after cleanup()")
+
+
 # Tests of:
 # def gpio_function(channel):
 
@@ -515,6 +586,19 @@ def test_wait_for_edge_timeout():
     GPIO.cleanup()
 
 
+@test
+def test_wait_for_edge_timeout_float():
+    GPIO.setmode(GPIO.BOARD)
+    GPIO.setup(pin_data['out_a'], GPIO.OUT, initial=GPIO.LOW)
+    GPIO.setup(pin_data['in_a'], GPIO.IN)
+    for timeout in ({'timeout': 0.05}, {'timeout_ms': 50}, {'timeout_ns': 50000000}):
+        start = time.time()
+        val = GPIO.wait_for_edge(pin_data['in_a'], GPIO.BOTH, **timeout)
+        assert val is None
+        assert 0.04 < time.time() - start < 0.5
+    GPIO.cleanup()
+
+
 class DelayedSetChannel(threading.Thread):
     def __init__(self, channel, value, delay):
         super(DelayedSetChannel, self).__init__()
@@ -553,6 +637,76 @@ def test_wait_for_edge_falling():
     GPIO.cleanup()
 
 
+@test
+def test_wait_for_edge_persistent():
+    GPIO.setmode(GPIO.BOARD)
+    GPIO.setup(pin_data['out_a'], GPIO.OUT, initial=GPIO.LOW)
+    GPIO.setup(pin_data['in_a'], GPIO.IN)
+    val = GPIO.wait_for_edge(pin_data['in_a'], GPIO.BOTH, timeout=1, persistent=True)
+    assert val is None
+
+    # The edges between the calls are kept for the next calls
+    GPIO.output(pin_data['out_a'], GPIO.HIGH)
+    GPIO.output(pin_data['out_a'], GPIO.LOW)
+    for i in range(2):
+        val = GPIO.wait_for_edge(pin_data['in_a'], GPIO.BOTH, timeout=1, persistent=True)
+        assert val == pin_data['in_a']
+    val = GPIO.wait_for_edge(pin_data['in_a'], GPIO.BOTH, timeout=1)
+    assert val is None
+
+    # The last call without persistent removed the edge detection
+    GPIO.add_event_detect(pin_data['in_a'], GPIO.BOTH)
+    GPIO.remove_event_detect(pin_data['in_a'])
+    GPIO.cleanup()
+
+
+@test
+def test_wait_for_edge_persistent_bouncetime():
+    GPIO.setmode(GPIO.BOARD)
+    GPIO.setup(pin_data['out_a'], GPIO.OUT, initial=GPIO.LOW)
+    GPIO.setup(pin_data['in_a'], GPIO.IN)
+    val = GPIO.wait_for_edge(pin_data['in_a'], GPIO.RISING, bouncetime=10, timeout=0.1,
+                             persistent=True)
+    assert val is None
+
+    # The edges between the calls are read at once, they are no bounces
+    for i in range(3):
+        GPIO.output(pin_data['out_a'], GPIO.HIGH)
+        time.sleep(0.05)
+        GPIO.output(pin_data['out_a'], GPIO.LOW)
+        time.sleep(0.05)
+    for i in range(3):
+        val = GPIO.wait_for_edge(pin_data['in_a'], GPIO.RISING, bouncetime=10, timeout=0.1,
+                                 persistent=True)
+        assert val == pin_data['in_a']
+    val = GPIO.wait_for_edge(pin_data['in_a'], GPIO.RISING, bouncetime=10, timeout=0.1)
+    assert val is None
+    GPIO.cleanup()
+
+
+@test
+def test_wait_for_any_edge():
+    GPIO.setmode(GPIO.BOARD)
+    GPIO.setup([pin_data['out_a'], pin_data['out_b']], GPIO.OUT, initial=GPIO.LOW)
+    GPIO.setup([pin_data['in_a'], pin_data['in_b']], GPIO.IN)
+    val = GPIO.wait_for_any_edge([pin_data['in_a'], pin_data['in_b']], GPIO.RISING, timeout=1)
+    assert val is None
+
+    for channels in ([], [pin_data['in_a'], pin_data['in_a']]):
+        try:
+            GPIO.wait_for_any_edge(channels, GPIO.RISING, timeout=1)
+            assert False, "ValueError should have been raised"
+        except ValueError:
+            pass
+
+    dsc = DelayedSetChannel(pin_data['out_b'], GPIO.HIGH, 0.5)
+    dsc.start()
+    val = GPIO.wait_for_any_edge([pin_data['in_a'], pin_data['in_b']], GPIO.RISING, timeout=10)
+    dsc.join()
+    assert [(e.channel, e.edge) for e in val] == [(pin_data['in_b'], GPIO.RISING)]
+    GPIO.cleanup()
+
+
 # Tests of:
 # def add_event_detect(channel, edge, callback=None, bouncetime=None):
 # def event_detected(channel):
@@ -701,6 +855,213 @@ def test_event_detected_both():
         True
     )
 
+@test
+def test_event_detected_two_channels():
+    GPIO.setmode(GPIO.BOARD)
+    GPIO.setup([pin_data['out_a'], pin_data['out_b']], GPIO.OUT, initial=GPIO.LOW)
+    GPIO.setup(pin_data['in_a'], GPIO.IN)
+    GPIO.setup(pin_data['in_b'], GPIO.IN)
+    time.sleep(0.2)
+
+    # Both channels are served by the same event thread, each event must only
+    # be reported on its own channel
+    GPIO.add_event_detect(pin_data['in_a'], GPIO.RISING, polltime=0.2)
+    GPIO.add_event_detect(pin_data['in_b'], GPIO.RISING, polltime=0.2)
+    assert not GPIO.event_detected(pin_data['in_a'])
+    assert not GPIO.event_detected(pin_data['in_b'])
+
+    GPIO.output(pin_data['out_a'], GPIO.HIGH)
+    time.sleep(0.2)
+    assert GPIO.event_detected(pin_data['in_a'])
+    assert not GPIO.event_detected(pin_data['in_b'])
+
+    GPIO.remove_event_detect(pin_data['in_a'])
+    GPIO.output(pin_data['out_b'], GPIO.HIGH)
+    time.sleep(0.2)
+    assert GPIO.event_detected(pin_data['in_b'])
+
+    GPIO.remove_event_detect(pin_data['in_b'])
+    GPIO.cleanup()
+
+@test
+def test_event_callback_pass_event():
+    GPIO.setmode(GPIO.BOARD)
+    GPIO.setup(pin_data['out_a'], GPIO.OUT, initial=GPIO.LOW)
+    GPIO.setup(pin_data['in_a'], GPIO.IN)
+    time.sleep(0.2)
+
+    edge_events = []
+    GPIO.add_event_detect(pin_data['in_a'], GPIO.BOTH, callback=edge_events.append,
+                          polltime=0.2, pass_event=True)
+    GPIO.output(pin_data['out_a'], GPIO.HIGH)
+    time.sleep(0.2)
+    GPIO.output(pin_data['out_a'], GPIO.LOW)
+    time.sleep(0.2)
+
+    assert [e.channel for e in edge_events] == [pin_data['in_a']] * 2
+    assert [e.edge for e in edge_events] == [GPIO.RISING, GPIO.FALLING]
+    assert edge_events[0].seqno < edge_events[1].seqno
+    assert edge_events[0].timestamp_ns < edge_events[1].timestamp_ns
+
+    GPIO.remove_event_detect(pin_data['in_a'])
+    GPIO.cleanup()
+
+@test
+def test_get_events_queue():
+    GPIO.setmode(GPIO.BOARD)
+    GPIO.setup(pin_data['out_a'], GPIO.OUT, initial=GPIO.LOW)
+    GPIO.setup(pin_data['in_a'], GPIO.IN)
+    time.sleep(0.2)
+
+    GPIO.add_event_detect(pin_data['in_a'], GPIO.BOTH, polltime=0.2, queue_size=2)
+    for output in (GPIO.HIGH, GPIO.LOW, GPIO.HIGH):
+        GPIO.output(pin_data['out_a'], output)
+        time.sleep(0.2)
+
+    # The first edge was dropped from the full queue
+    assert [e.edge for e in GPIO.get_events(pin_data['in_a'], 1)] == [GPIO.FALLING]
+    assert [e.edge for e in GPIO.get_events(pin_data['in_a'])] == [GPIO.RISING]
+    assert GPIO.get_events(pin_data['in_a']) == []
+    assert GPIO.events_dropped(pin_data['in_a']) == 1
+
+    GPIO.remove_event_detect(pin_data['in_a'])
+    GPIO.cleanup()
+
+@test
+def test_event_detected_bouncetime_us():
+    GPIO.setmode(GPIO.BOARD)
+    GPIO.setup(pin_data['out_a'], GPIO.OUT, initial=GPIO.LOW)
+    GPIO.setup(pin_data['in_a'], GPIO.IN)
+    time.sleep(0.2)
+
+    try:
+        GPIO.add_event_detect(pin_data['in_a'], GPIO.BOTH, bouncetime=1, bouncetime_us=1000)
+        assert False, "ValueError should have been raised"
+    except ValueError:
+        pass
+
+    GPIO.add_event_detect(pin_data['in_a'], GPIO.BOTH, polltime=0.2, queue_size=4,
+                          bouncetime_us=100000)
+    # A glitch, then a stable rising edge
+    GPIO.output(pin_data['out_a'], GPIO.HIGH)
+    GPIO.output(pin_data['out_a'], GPIO.LOW)
+    time.sleep(0.2)
+    GPIO.output(pin_data['out_a'], GPIO.HIGH)
+    time.sleep(0.2)
+
+    edges = [e.edge for e in GPIO.get_events(pin_data['in_a'])]
+    if gpio_cdev.kernel_debounce():
+        # The kernel only reports the edges the line is stable after
+        assert edges == [GPIO.RISING]
+    else:
+        # The falling edge of the glitch bounces off its rising edge
+        assert edges == [GPIO.RISING, GPIO.RISING]
+
+    GPIO.remove_event_detect(pin_data['in_a'])
+    GPIO.cleanup()
+
+@test
+def test_event_detected_bouncetime_behind_slow_callback():
+    GPIO.setmode(GPIO.BOARD)
+    GPIO.setup([pin_data['out_a'], pin_data['out_b']], GPIO.OUT, initial=GPIO.LOW)
+    GPIO.setup([pin_data['in_a'], pin_data['in_b']], GPIO.IN)
+    time.sleep(0.2)
+
+    GPIO.add_event_detect(pin_data['in_b'], GPIO.RISING, callback=lambda channel: time.sleep(0.5))
+    GPIO.add_event_detect(pin_data['in_a'], GPIO.RISING, queue_size=4, bouncetime=10)
+    # The events of in_a are read at once after the slow callback of in_b
+    GPIO.output(pin_data['out_b'], GPIO.HIGH)
+    time.sleep(0.05)
+    for i in range(2):
+        GPIO.output(pin_data['out_a'], GPIO.HIGH)
+        time.sleep(0.05)
+        GPIO.output(pin_data['out_a'], GPIO.LOW)
+        time.sleep(0.05)
+    time.sleep(0.6)
+
+    # Edges 100 ms apart are no bounces, however late they are read
+    assert [e.edge for e in GPIO.get_events(pin_data['in_a'])] == [GPIO.RISING, GPIO.RISING]
+
+    GPIO.remove_event_detect(pin_data['in_a'])
+    GPIO.remove_event_detect(pin_data['in_b'])
+    GPIO.cleanup()
+
+@test
+def test_async_wait_for_edge():
+    GPIO.setmode(GPIO.BOARD)
+    GPIO.setup(pin_data['out_a'], GPIO.OUT, initial=GPIO.LOW)
+    GPIO.setup(pin_data['in_a'], GPIO.IN)
+
+    async def wait_rising_then_stream():
+        loop = asyncio.get_running_loop()
+        loop.call_later(0.5, GPIO.output, pin_data['out_a'], GPIO.HIGH)
+        val = await GPIO.async_wait_for_edge(pin_data['in_a'], GPIO.RISING, timeout=10)
+        assert val == pin_data['in_a']
+
+        loop.call_later(0.5, GPIO.output, pin_data['out_a'], GPIO.LOW)
+        edge_events = GPIO.edge_events(pin_data['in_a'])
+        async for edge_event in edge_events:
+            assert edge_event.channel == pin_data['in_a']
+            assert edge_event.edge == GPIO.FALLING
+            break
+        await edge_events.aclose()
+
+    asyncio.run(wait_rising_then_stream())
+    GPIO.cleanup()
+
+@test
+def test_event_callback_executor():
+    GPIO.setmode(GPIO.BOARD)
+    GPIO.setup(pin_data['out_a'], GPIO.OUT, initial=GPIO.LOW)
+    GPIO.setup(pin_data['in_a'], GPIO.IN)
+    time.sleep(0.2)
+
+    callback_threads = []
+    def callback(channel):
+        callback_threads.append(threading.current_thread())
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        GPIO.add_event_detect(pin_data['in_a'], GPIO.RISING, callback=callback,
+                              polltime=0.2, executor=executor, backlog=4)
+        GPIO.output(pin_data['out_a'], GPIO.HIGH)
+        time.sleep(0.2)
+        GPIO.remove_event_detect(pin_data['in_a'])
+
+    assert len(callback_threads) == 1
+    assert callback_threads[0].name.startswith('ThreadPoolExecutor')
+    GPIO.cleanup()
+
+@test
+def test_event_callback_executor_shut_down():
+    GPIO.setmode(GPIO.BOARD)
+    GPIO.setup([pin_data['out_a'], pin_data['out_b']], GPIO.OUT, initial=GPIO.LOW)
+    GPIO.setup([pin_data['in_a'], pin_data['in_b']], GPIO.IN)
+    time.sleep(0.2)
+
+    executor = ThreadPoolExecutor(max_workers=1)
+    GPIO.add_event_detect(pin_data['in_a'], GPIO.RISING, callback=lambda channel: None,
+                          executor=executor, backlog=1, overflow=GPIO.BLOCK)
+    GPIO.add_event_detect(pin_data['in_b'], GPIO.RISING, queue_size=4)
+    executor.shutdown()
+
+    # The events the executor does not take are dropped, the other channels
+    # are still served
+    with warnings.catch_warnings(record=True):
+        warnings.simplefilter('always')
+        for i in range(2):
+            GPIO.output(pin_data['out_a'], GPIO.HIGH)
+            time.sleep(0.05)
+            GPIO.output(pin_data['out_a'], GPIO.LOW)
+            time.sleep(0.05)
+        GPIO.output(pin_data['out_b'], GPIO.HIGH)
+        time.sleep(0.2)
+
+    assert GPIO.callbacks_dropped(pin_data['in_a']) == 2
+    assert [e.edge for e in GPIO.get_events(pin_data['in_b'])] == [GPIO.RISING]
+    GPIO.remove_event_detect(pin_data['in_a'])
+    GPIO.remove_event_detect(pin_data['in_b'])
+    GPIO.cleanup()
+
 # Tests of multiple:
 # def add_event_callback(channel, callback):
 
@@ -1045,6 +1406,46 @@ def test_orin_nano_nx_pinmux_warnings():
             raise Exception(f"Unexpected warnings occured: {w}")
         
 
+# Tests of class Port
+
+
+@test
+def test_port_out_in():
+    GPIO.setmode(GPIO.BOARD)
+    port = GPIO.Port((pin_data['out_a'], pin_data['out_b']), GPIO.OUT,
+                     initial=0x1)
+    GPIO.setup(pin_data['in_a'], GPIO.IN)
+    assert port.read() == 0x1
+    val = GPIO.input(pin_data['in_a'])
+    assert(val == GPIO.HIGH)
+    port.write(0x2)
+    assert port.read() == 0x2
+    val = GPIO.input(pin_data['in_a'])
+    assert(val == GPIO.LOW)
+    GPIO.cleanup()
+
+
+@test
+def test_port_channel_set_up_again():
+    GPIO.setmode(GPIO.BOARD)
+    port = GPIO.Port((pin_data['out_a'], pin_data['out_b']), GPIO.OUT,
+                     initial=0x1)
+    GPIO.setup(pin_data['in_a'], GPIO.IN)
+    GPIO.cleanup(pin_data['out_b'])
+    GPIO.setup(pin_data['out_b'], GPIO.OUT)
+    port.write(0x2)
+    assert port.read() == 0x2
+    val = GPIO.input(pin_data['in_a'])
+    assert(val == GPIO.LOW)
+    GPIO.cleanup(pin_data['out_b'])
+    try:
+        port.write(0x1)
+        raise Exception("Should have thrown RuntimeError")
+    except RuntimeError:
+        pass
+    GPIO.cleanup()
+
+
 # Tests of class PWM
 
 